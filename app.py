@@ -1,13 +1,26 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
 from dotenv import load_dotenv
 import streamlit as st
 from models.itinerary import Itinerary
-from utils.parsing import display_itinerary
+from utils.parsing import display_itinerary, extract_day, replace_day
+from utils.llm import load_model
+from utils.prompts import (
+    itinerary_template, flight_template, chat_template, day_edit_template, personalize
+)
+from utils.jobs import JobRunner
+from utils.retrieval import build_chat_context, chunk_itinerary
+from utils.generation import run_generation
+from utils.similar import similar_index
+from utils.admission import (
+    admission, Overloaded, UNAVAILABLE_MESSAGE, PRIORITY_CHAT, PRIORITY_FLIGHTS, PRIORITY_DAY_EDIT,
+    PRIORITY_GENERATION
+)
 from database.db import (
     init_db, create_user, authenticate_user, save_itinerary, get_itineraries,
-    get_public_itineraries, save_chat_message, get_chat_history, get_user,
-    set_user_admin, list_users
+    get_public_itineraries, save_chat_exchange, get_chat_page, get_chat_messages_after,
+    get_user, set_user_admin, list_users, catalog_cache_stats, get_generation_job,
+    list_generation_jobs, get_pregenerated_itinerary, update_itinerary_content,
+    gist_client_stats, create_snapshot, list_snapshots, start_backup_scheduler,
+    generation_budget_report
 )
 import os
 import uuid
@@ -41,42 +54,179 @@ st.set_page_config(
 load_dotenv()
 init_db()
 
+
+@st.cache_resource
+def _backup_scheduler():
+    # Periodic snapshots when BACKUP_INTERVAL is set; one scheduler per process
+    return start_backup_scheduler()
+
+
+_backup_scheduler()
+
+
+@st.cache_resource
+def _similar_trips_index():
+    # Built on a background thread at startup so no page waits for it
+    similar_index.start()
+    return similar_index
+
+
+_similar_trips_index()
+
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# Background jobs are not holding up a page, so they may wait longer for a model slot
+JOB_ADMISSION_WAIT = float(os.getenv("JOB_ADMISSION_WAIT", "300"))
 
 # -------------------- Model Loading --------------------
 @st.cache_resource
 def _load_model():
-    llm = HuggingFaceEndpoint(
-        repo_id="mistralai/Mistral-7B-Instruct-v0.3", task="text-generation"
-    )
-    return ChatHuggingFace(llm=llm)
+    # Backend is picked by LLM_BACKEND (huggingface by default, "fake" for local load tests)
+    return load_model()
 
 # Cached global model (fixes NameError)
 model = _load_model()
 
-def _get_template():
-    return PromptTemplate(
-        input_variables=[
-            "destination", "duration_days", "budget", "preferences",
-            "user_questions", "user_name", "num_people"
-        ],
-        template="""
-You are a friendly, professional travel planner AI.
-Generate a detailed, day-wise itinerary for {destination}.
-
-Duration: {duration_days} days
-Budget: {budget}
-Preferences: {preferences}
-User: {user_name}, traveling with {num_people} people.
-
-If user provided questions: {user_questions}
-
-Output clearly structured text with headings:
-Day 1, Day 2, etc., including activities, restaurants, timing, and short notes.
-Avoid photos or image placeholders.
-"""
-    )
+
+@st.cache_resource
+def _job_runner():
+    # One worker pool per process, shared by every session
+    runner = JobRunner(lambda params: run_generation(
+        _load_model(), itinerary_template(), params, "itinerary", PRIORITY_GENERATION,
+        duration_days=params["duration_days"], max_wait=JOB_ADMISSION_WAIT))
+    runner.recover()
+    return runner
+
+
+def _ask_model(prompt, inputs, kind, priority):
+    """Run a prompt through admission control and its token budget; returns the text or None after telling the user why."""
+    try:
+        return run_generation(model, prompt, inputs, kind, priority)
+    except Overloaded as e:
+        st.warning(f"🚦 {e}")
+    except Exception:
+        st.error(UNAVAILABLE_MESSAGE)
+    return None
+
+
+def _edit_day(itinerary, user_id):
+    """Let the user regenerate a single day and splice it back into the itinerary."""
+    chunks = chunk_itinerary(itinerary.content)
+    days = [(label, text) for label, text in chunks if label.startswith("Day ")]
+    if not days:
+        return
+    with st.expander("✏️ Edit a single day"):
+        day_label = st.selectbox("Day", [label for label, _ in days], key=f"edit_day_{itinerary.id}")
+        instructions = st.text_area("What should change?", key=f"edit_day_instr_{itinerary.id}",
+                                    placeholder="e.g., swap the museum for a beach afternoon")
+        if st.button("Regenerate this day", key=f"edit_day_btn_{itinerary.id}"):
+            if not instructions.strip():
+                st.error("Describe the change you want.")
+                return
+            day_text = dict(days)[day_label]
+            with st.spinner(f"Rewriting {day_label}..."):
+                # Only the outline and the one day go to the model, not the whole trip
+                new_day = _ask_model(day_edit_template(), {
+                    "destination": itinerary.destination,
+                    "budget": itinerary.budget,
+                    "num_people": itinerary.num_people or 1,
+                    "outline": "\n".join(f"- {text.splitlines()[0].strip()}" for _, text in chunks),
+                    "day_text": day_text,
+                    "day_label": day_label,
+                    "instructions": instructions,
+                }, "day_edit", PRIORITY_DAY_EDIT)
+            if new_day:
+                day_number = int(day_label.split()[1])
+                # Keep only the requested day; replies sometimes add a preamble or more days
+                new_day = extract_day(new_day, day_number)
+                if not new_day:
+                    st.error(f"The AI reply did not contain a plan for {day_label}. Please try again.")
+                    return
+                content = replace_day(itinerary.content, day_number, new_day)
+                version = update_itinerary_content(itinerary.id, user_id, content, note=f"Before editing {day_label}")
+                if itinerary.is_public:
+                    similar_index.upsert(Itinerary.from_dict(dict(itinerary.to_dict(), content=content)))
+                st.success(f"{day_label} updated. The previous text is kept as version {version}.")
+                st.rerun()
+
+
+def _similar_trips(itinerary):
+    """List the public itineraries closest to this one."""
+    try:
+        matches = similar_index.similar(itinerary, k=5)
+    except Exception:
+        return
+    if not matches:
+        if not similar_index.ready:
+            st.caption("🧭 Similar trips will appear here once public itineraries are indexed.")
+        return
+    with st.expander("🧭 Similar trips"):
+        for match in matches:
+            by = f" · shared by {match['user_name']}" if match['user_name'] else ""
+            st.markdown(f"**{match['name']}** — {match['destination']}, {match['duration']} days, "
+                        f"{match['budget'] or 'any budget'}{by}")
+
+
+def _open_job_result(job):
+    params = job["params"]
+    st.session_state["generated_itinerary"] = job["result"]
+    st.session_state["itinerary_details"] = {
+        "destination": params["destination"],
+        "duration": params["duration_days"],
+        "budget": params["budget"],
+        "preferences": params["preferences"],
+        "user_name": params["user_name"],
+        "num_people": params["num_people"],
+    }
+
+
+def _generation_status():
+    """Poll the session's pending generation job and pick up its result."""
+    job_id = st.session_state.get("generation_job_id")
+    if not job_id:
+        return
+    job = get_generation_job(job_id)
+    if job and job["status"] in ("queued", "running"):
+        st.info(f"⏳ Your itinerary is {job['status']}... You can keep using the app, "
+                "the result is saved as soon as it is ready.")
+        if not hasattr(st, "fragment"):
+            st.button("Check status", key="check_generation_job")
+        return
+    del st.session_state["generation_job_id"]
+    if job and job["status"] == "done":
+        _open_job_result(job)
+        st.session_state["generation_done"] = True
+    else:
+        st.session_state["generation_error"] = job["error"] if job else "The generation job could not be found."
+    st.rerun()
+
+
+if hasattr(st, "fragment"):
+    _generation_status = st.fragment(run_every=JOB_POLL_SECONDS)(_generation_status)
+
+
+def _render_chat(itinerary_id):
+    """Show the latest chat page plus any older pages the user asked for."""
+    key = f"chat_older_{itinerary_id}"
+    older = st.session_state.get(key)
+    if older:
+        # Older pages are already in session; only fetch what came after them
+        recent = get_chat_messages_after(itinerary_id, older["messages"][-1]["id"])
+        has_more = older["has_more"]
+        messages = older["messages"] + recent
+    else:
+        messages, has_more = get_chat_page(itinerary_id)
+
+    if has_more and st.button("Load older messages", key=f"load_older_{itinerary_id}"):
+        page, has_more = get_chat_page(itinerary_id, before_id=messages[0]["id"])
+        messages = page + messages
+        st.session_state[key] = {"messages": messages, "has_more": has_more}
+
+    for chat in messages:
+        with st.chat_message(chat["role"]):
+            st.markdown(chat["content"])
+
 
 # -------------------- Auth Section --------------------
 if "user_id" not in st.session_state:
@@ -198,29 +348,37 @@ else:
                 if not destination or not user_name:
                     st.error("Please fill Destination and Name.")
                 else:
-                    with st.spinner("Generating your itinerary..."):
-                        template = _get_template()
-                        chain = template | model
-                        result = chain.invoke({
-                            "destination": destination,
-                            "duration_days": duration_days,
-                            "budget": budget,
-                            "preferences": preferences,
-                            "user_questions": user_questions,
-                            "user_name": user_name,
-                            "num_people": num_people,
-                        })
-                        st.session_state["generated_itinerary"] = result.content
-                        st.session_state["itinerary_details"] = {
-                            "destination": destination,
-                            "duration": duration_days,
-                            "budget": budget,
-                            "preferences": preferences,
-                            "user_name": user_name,
-                            "num_people": num_people,
-                        }
-                        st.success("Itinerary generated!")
-                        st.balloons()
+                    params = {
+                        "destination": destination,
+                        "duration_days": duration_days,
+                        "budget": budget,
+                        "preferences": preferences,
+                        "user_questions": user_questions,
+                        "user_name": user_name,
+                        "num_people": num_people,
+                    }
+                    # Popular trips may already be generated by pregenerate.py
+                    cached = None if user_questions.strip() else get_pregenerated_itinerary(params)
+                    if cached:
+                        _open_job_result({"params": params, "result": personalize(cached, user_name)})
+                        st.session_state["generation_done"] = True
+                    else:
+                        st.session_state["generation_job_id"] = _job_runner().submit(user_id, params)
+
+        _generation_status()
+        if st.session_state.pop("generation_done", False):
+            st.success("Itinerary generated!")
+            st.balloons()
+        if "generation_error" in st.session_state:
+            st.error(f"Generation failed: {st.session_state.pop('generation_error')}")
+
+        recent_jobs = [job for job in list_generation_jobs(user_id, limit=5) if job["status"] == "done"]
+        if recent_jobs:
+            with st.expander("Recent generations"):
+                for job in recent_jobs:
+                    p = job["params"]
+                    if st.button(f"Open: {p['destination']}, {p['duration_days']} days", key=f"open_job_{job['id']}"):
+                        _open_job_result(job)
 
         if "generated_itinerary" in st.session_state:
             st.subheader("📅 Your Generated Itinerary")
@@ -240,7 +398,9 @@ else:
                         is_public=is_public,
                         num_people=st.session_state["itinerary_details"].get("num_people", 1),
                     )
-                    save_itinerary(itinerary, user_id)
+                    itinerary.id = save_itinerary(itinerary, user_id)
+                    if is_public:
+                        similar_index.upsert(itinerary)
                     del st.session_state["generated_itinerary"]
                     del st.session_state["itinerary_details"]
                     st.success("Itinerary saved!")
@@ -273,49 +433,41 @@ else:
                 if st.button("View Itinerary"):
                     display_itinerary(selected_it.content, theme)
 
+                _edit_day(selected_it, user_id)
+                _similar_trips(selected_it)
+
                 # ✈️ Flight search
                 st.markdown("**Find Best Flights**")
                 dep_city = st.text_input("Departure city", key=f"dep_my_{selected_it.id}")
                 if st.button("Find Flights", key=f"find_flights_my_{selected_it.id}"):
                     origin = dep_city.strip() or "Your nearest major airport"
-                    flight_template = PromptTemplate(
-                        input_variables=["origin", "destination"],
-                        template="""You are a travel assistant. Provide top 3 flight options 
-                        from {origin} to {destination}. For each: airline, price (INR), duration, stops, and short note."""
-                    )
-                    flight_chain = flight_template | model
                     with st.spinner("Fetching flight options..."):
-                        flight_resp = flight_chain.invoke({
+                        flight_resp = _ask_model(flight_template(), {
                             "origin": origin,
                             "destination": selected_it.destination
-                        }).content.strip()
-                    st.info(flight_resp)
+                        }, "flights", PRIORITY_FLIGHTS)
+                    if flight_resp:
+                        st.info(flight_resp)
 
                 # 💬 Chat Conversation (kept)
                 st.markdown("### 💬 Chat with AI about this itinerary")
-                chat_history = get_chat_history(selected_it.id)
-                for chat in chat_history:
-                    with st.chat_message(chat["role"]):
-                        st.markdown(chat["content"])
+                _render_chat(selected_it.id)
 
                 if prompt := st.chat_input("Ask something about your itinerary..."):
-                    save_chat_message(selected_it.id, "user", prompt)
                     with st.chat_message("user"):
                         st.markdown(prompt)
 
                     with st.chat_message("assistant"):
                         with st.spinner("Thinking..."):
-                            chat_prompt = PromptTemplate(
-                                input_variables=["itinerary", "question"],
-                                template="You are a travel assistant. Given this itinerary: {itinerary}. Answer: {question}"
-                            )
-                            chat_chain = chat_prompt | model
-                            answer = chat_chain.invoke({
-                                "itinerary": selected_it.content,
+                            answer = _ask_model(chat_template(), {
+                                # Only the outline and the sections relevant to the question
+                                "itinerary": build_chat_context(selected_it.id, selected_it.content, prompt),
                                 "question": prompt
-                            }).content.strip()
-                            st.markdown(answer)
-                            save_chat_message(selected_it.id, "assistant", answer)
+                            }, "chat", PRIORITY_CHAT)
+                            if answer:
+                                st.markdown(answer)
+                                # Question and answer are committed together
+                                save_chat_exchange(selected_it.id, prompt, answer)
 
         # ---- Public Itineraries ----
         with tab2:
@@ -334,24 +486,20 @@ else:
                 st.write(f"People: {selected_pub.num_people or 1}")
                 st.write(f"Preferences: {selected_pub.preferences}")
                 st.write(f"Shared by: {selected_pub.user_name}")
+                _similar_trips(selected_pub)
 
                 # ✈️ Flight search
                 st.markdown("**Find Best Flights**")
                 dep_city_pub = st.text_input("Departure city", key=f"dep_pub_{selected_pub.id}")
                 if st.button("Find Flights", key=f"find_flights_pub_{selected_pub.id}"):
                     origin = dep_city_pub.strip() or "Your nearest major airport"
-                    flight_template = PromptTemplate(
-                        input_variables=["origin", "destination"],
-                        template="""You are a travel assistant. Provide top 3 flight options 
-                        from {origin} to {destination}. For each: airline, price (INR), duration, stops, and short note."""
-                    )
-                    flight_chain = flight_template | model
                     with st.spinner("Fetching flight options..."):
-                        flight_resp = flight_chain.invoke({
+                        flight_resp = _ask_model(flight_template(), {
                             "origin": origin,
                             "destination": selected_pub.destination
-                        }).content.strip()
-                    st.info(flight_resp)
+                        }, "flights", PRIORITY_FLIGHTS)
+                    if flight_resp:
+                        st.info(flight_resp)
 
                 # Copy itinerary
                 st.markdown("**Save to My Itineraries**")
@@ -379,5 +527,23 @@ else:
         with tab_storage:
             st.subheader("🗄️ Admin Storage Panel")
             st.info("Admin-only storage management tools (optional).")
+            st.markdown("**Itinerary catalog cache**")
+            st.json(catalog_cache_stats())
+            st.markdown("**Model admission control**")
+            st.json(admission.stats())
+            st.markdown("**Output tokens against budget**")
+            st.dataframe(generation_budget_report())
+            st.markdown("**Gist backup client**")
+            st.json(gist_client_stats())
+            st.markdown("**Database snapshots**")
+            if st.button("Create snapshot now"):
+                with st.spinner("Copying database..."):
+                    st.success(f"Snapshot written to {create_snapshot()}")
+            snapshots = list_snapshots()
+            if snapshots:
+                for snap in snapshots:
+                    st.write(f"{snap['name']} — {snap['size'] / 1024:.0f} KiB")
+            else:
+                st.info("No snapshots yet.")
 
 st.caption("🚀 Powered by AI | Built with Streamlit + LangChain")
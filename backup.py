@@ -0,0 +1,43 @@
+"""Take, list and restore SQLite snapshots of the itinerary database.
+
+    python backup.py snapshot            # compressed snapshot into BACKUP_DIR
+    python backup.py list
+    python backup.py restore backups/itineraries-20260101-120000-000.db.gz
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.db import create_snapshot, list_snapshots, restore_snapshot  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    snap = sub.add_parser('snapshot', help='take a snapshot now')
+    snap.add_argument('--no-compress', action='store_true')
+    snap.add_argument('--keep', type=int, default=None, help='snapshots to retain (default BACKUP_KEEP)')
+    sub.add_parser('list', help='list snapshots, newest first')
+    restore = sub.add_parser('restore', help='overwrite the database with a snapshot')
+    restore.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'snapshot':
+        start = time.perf_counter()
+        path = create_snapshot(compress=not args.no_compress, keep=args.keep)
+        print(f"{path} ({os.path.getsize(path) / 1024:.0f} KiB) in {time.perf_counter() - start:.2f}s")
+    elif args.command == 'list':
+        for snap in list_snapshots():
+            print(f"{snap['name']}\t{snap['size'] / 1024:.0f} KiB")
+    elif args.command == 'restore':
+        start = time.perf_counter()
+        restore_snapshot(args.path)
+        print(f"restored {args.path} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Upper bound on cached catalogs (one per user plus the public list)
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', '512'))
+# Entries older than this are reloaded even without a version bump, so writes made
+# by other app processes on the same database show up eventually
+CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', '30'))
+
+
+class VersionedCache:
+    """Process-wide read-through cache keyed by scope.
+
+    Each scope (e.g. ``('user', 3)`` or ``'public'``) has a version counter.
+    Writers call ``bump(scope)``; cached values stamped with an older version are
+    treated as misses and reloaded. The least recently used scopes are evicted once
+    ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries=CATALOG_CACHE_MAX_ENTRIES, ttl=CATALOG_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def bump(self, scope):
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+            self._entries.pop(scope, None)
+            self.invalidations += 1
+
+    def get_or_load(self, scope, loader):
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(scope, 0)
+            entry = self._entries.get(scope)
+            if entry and entry[0] == version and now - entry[1] < self.ttl:
+                self._entries.move_to_end(scope)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            # Only store if no writer bumped the scope while we were loading
+            if self._versions.get(scope, 0) == version:
+                self._entries[scope] = (version, now, value)
+                self._entries.move_to_end(scope)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+            }
@@ -3,10 +3,17 @@ import os
 import hashlib
 import csv
 import threading
-import requests
+import queue
+import time
 import json
 import io
+import re
+import gzip
+import shutil
+from concurrent.futures import Future
 from models.itinerary import Itinerary
+from database.cache import VersionedCache
+from database.gist_client import GistClient
 
 DB_PATH = 'itineraries.db'
 USERS_CSV = 'users.csv'
@@ -15,6 +22,28 @@ CHAT_CSV = 'chat_messages.csv'
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 GIST_ID_ENV = os.getenv('GIST_ID')
 GIST_ID_FILE = '.gist_id'
+GIST_API_URL = os.getenv('GIST_API_URL', 'https://api.github.com').rstrip('/')
+# Local copy of gist files, revalidated with ETags
+GIST_CACHE_DIR = os.getenv('GIST_CACHE_DIR', '.gist_cache')
+# Seconds the local copy is trusted without even a conditional request
+GIST_CACHE_TTL = float(os.getenv('GIST_CACHE_TTL', '30'))
+# Seconds a connection waits on a lock held by another process before giving up
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '30'))
+# Extra attempts for a write transaction that still hits "database is locked"
+DB_WRITE_RETRIES = int(os.getenv('DB_WRITE_RETRIES', '5'))
+# SQLite snapshots: where they go, how many to keep and how often to take them (0 = never)
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '10'))
+BACKUP_INTERVAL = float(os.getenv('BACKUP_INTERVAL', '0'))
+# Pages copied per backup step, and the pause between steps that lets writers in
+BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', '256'))
+BACKUP_STEP_SLEEP = float(os.getenv('BACKUP_STEP_SLEEP', '0.005'))
+# Messages per page in the dashboard chat view
+CHAT_PAGE_SIZE = int(os.getenv('CHAT_PAGE_SIZE', '20'))
+
+USERS_HEADERS = ['id', 'username', 'password_hash', 'is_admin']
+ITINERARIES_HEADERS = ['id', 'user_id', 'name', 'content', 'destination', 'duration', 'budget', 'preferences', 'user_name', 'is_public', 'num_people']
+CHAT_HEADERS = ['id', 'itinerary_id', 'role', 'content']
 
 
 def _get_stored_gist_id():
@@ -29,67 +58,196 @@ def _get_stored_gist_id():
     return None
 
 
+_gist_lock = threading.Lock()
+_validated_gist_id = None
+
+
+_gist_client = None
+
+
+def get_gist_client():
+    """Return the process-wide gist client, creating it on first use."""
+    global _gist_client
+    with _gist_lock:
+        if _gist_client is None:
+            _gist_client = GistClient(GIST_API_URL, GITHUB_TOKEN)
+        return _gist_client
+
+
+def set_gist_client(client):
+    """Swap the gist client, e.g. for one pointed at a local stub server."""
+    global _gist_client, _validated_gist_id
+    with _gist_lock:
+        _gist_client = client
+        _validated_gist_id = None
+
+
+def gist_client_stats():
+    return get_gist_client().stats()
+
+
 def init_gist():
-    """Ensure a gist exists and return its id. Returns None if no GITHUB_TOKEN is configured."""
+    """Ensure a gist exists and return its id. Returns None if no GITHUB_TOKEN is configured.
+
+    The id is validated (or the gist created) once per process and reused afterwards.
+    """
+    global _validated_gist_id
     if not GITHUB_TOKEN:
         return None
-    headers = {'Authorization': f'token {GITHUB_TOKEN}', 'Accept': 'application/vnd.github.v3+json'}
-    gist_id = _get_stored_gist_id()
-    # validate existing gist
-    if gist_id:
+    client = get_gist_client()
+    with _gist_lock:
+        if _validated_gist_id:
+            return _validated_gist_id
+        gist_id = _get_stored_gist_id()
+        # validate existing gist
+        if gist_id:
+            try:
+                r = client.get(f'/gists/{gist_id}')
+                if r.ok:
+                    _store_gist_response(gist_id, r)
+                    _validated_gist_id = gist_id
+                    return gist_id
+            except Exception:
+                pass
+
+        # create a new private gist with initial CSV headers
+        initial_files = {
+            USERS_CSV: {'content': ','.join(USERS_HEADERS) + '\n'},
+            ITINERARIES_CSV: {'content': ','.join(ITINERARIES_HEADERS) + '\n'},
+            CHAT_CSV: {'content': ','.join(CHAT_HEADERS) + '\n'}
+        }
+        payload = {'description': 'Travel Itinerary AI data backup', 'public': False, 'files': initial_files}
         try:
-            r = requests.get(f'https://api.github.com/gists/{gist_id}', headers=headers, timeout=6)
-            if r.ok:
+            resp = client.post('/gists', json=payload)
+            if resp.ok:
+                gist_id = resp.json().get('id')
+                try:
+                    with open(GIST_ID_FILE, 'w') as f:
+                        f.write(gist_id)
+                except Exception:
+                    pass
+                _validated_gist_id = gist_id
                 return gist_id
         except Exception:
             pass
+        return None
 
-    # create a new private gist with initial CSV headers
-    initial_files = {
-        USERS_CSV: {'content': 'id,username,password_hash,is_admin\n'},
-        ITINERARIES_CSV: {'content': 'id,user_id,name,content,destination,duration,budget,preferences,user_name,is_public,num_people\n'},
-        CHAT_CSV: {'content': 'id,itinerary_id,role,content\n'}
-    }
-    payload = {'description': 'Travel Itinerary AI data backup', 'public': False, 'files': initial_files}
+
+# -------------------- Local gist mirror --------------------
+_mirror_lock = threading.Lock()
+
+
+def _mirror_path(gist_id, name):
+    return os.path.join(GIST_CACHE_DIR, gist_id, os.path.basename(name))
+
+
+def _load_mirror_meta(gist_id):
     try:
-        resp = requests.post('https://api.github.com/gists', headers=headers, json=payload, timeout=10)
-        if resp.ok:
-            gist_id = resp.json().get('id')
-            try:
-                with open(GIST_ID_FILE, 'w') as f:
-                    f.write(gist_id)
-            except Exception:
-                pass
-            return gist_id
+        with open(_mirror_path(gist_id, 'meta.json')) as f:
+            return json.load(f)
     except Exception:
+        return {}
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w', newline='') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _save_mirror(gist_id, meta, files=None):
+    """Write file contents (name -> text) and the metadata for a gist's local copy."""
+    with _mirror_lock:
+        for name, content in (files or {}).items():
+            _write_atomic(_mirror_path(gist_id, f'file-{name}'), content)
+        _write_atomic(_mirror_path(gist_id, 'meta.json'), json.dumps(meta))
+
+
+def _read_mirror_file(gist_id, filename, meta):
+    """Return the mirrored content of filename, fetching truncated files by raw URL once."""
+    if filename not in meta.get('files', []):
+        return None
+    path = _mirror_path(gist_id, f'file-{filename}')
+    try:
+        with open(path, newline='') as f:
+            return f.read()
+    except OSError:
         pass
-    return None
+    raw_url = meta.get('raw_urls', {}).get(filename)
+    if not raw_url:
+        return None
+    try:
+        # raw URLs point at a fixed revision, so the download can be kept as-is
+        r = get_gist_client().get(raw_url)
+        if not r.ok:
+            return None
+        _save_mirror(gist_id, meta, {filename: r.text})
+        return r.text
+    except Exception:
+        return None
+
+
+def _store_gist_response(gist_id, r):
+    """Mirror the files from a full gist response and remember its ETag."""
+    files = r.json().get('files', {})
+    contents = {}
+    raw_urls = {}
+    for name, f in files.items():
+        if f.get('truncated'):
+            # Large files are cut short in the API response; fetch them lazily
+            raw_urls[name] = f.get('raw_url')
+            try:
+                os.remove(_mirror_path(gist_id, f'file-{name}'))
+            except OSError:
+                pass
+        else:
+            contents[name] = f.get('content', '')
+    meta = {'etag': r.headers.get('ETag'), 'fetched_at': time.time(), 'files': sorted(files), 'raw_urls': raw_urls}
+    _save_mirror(gist_id, meta, contents)
+    return meta
+
 
+def _read_gist_file_content(gist_id, filename, max_age=GIST_CACHE_TTL):
+    """Return a gist file's content, trusting the local mirror for up to max_age seconds.
 
-def _read_gist_file_content(gist_id, filename):
+    With max_age=0 the mirror is always revalidated (a 304 when nothing changed).
+    """
     if not GITHUB_TOKEN or not gist_id:
         return None
-    headers = {'Authorization': f'token {GITHUB_TOKEN}', 'Accept': 'application/vnd.github.v3+json'}
+    meta = _load_mirror_meta(gist_id)
+    if meta and time.time() - meta.get('fetched_at', 0) < max_age:
+        return _read_mirror_file(gist_id, filename, meta)
+    headers = {'If-None-Match': meta['etag']} if meta and meta.get('etag') else {}
     try:
-        r = requests.get(f'https://api.github.com/gists/{gist_id}', headers=headers, timeout=6)
+        r = get_gist_client().get(f'/gists/{gist_id}', headers=headers)
+        if r.status_code == 304:
+            # Unchanged since our copy; 304s do not count against the API rate limit
+            meta['fetched_at'] = time.time()
+            _save_mirror(gist_id, meta)
+            return _read_mirror_file(gist_id, filename, meta)
         if not r.ok:
             return None
-        files = r.json().get('files', {})
-        f = files.get(filename)
-        if f:
-            return f.get('content', '')
+        return _read_mirror_file(gist_id, filename, _store_gist_response(gist_id, r))
     except Exception:
         return None
-    return None
 
 
 def _patch_gist_file(gist_id, filename, content):
     if not GITHUB_TOKEN or not gist_id:
         return False
-    headers = {'Authorization': f'token {GITHUB_TOKEN}', 'Accept': 'application/vnd.github.v3+json'}
     payload = {'files': {filename: {'content': content}}}
     try:
-        r = requests.patch(f'https://api.github.com/gists/{gist_id}', headers=headers, json=payload, timeout=8)
+        r = get_gist_client().patch(f'/gists/{gist_id}', json=payload)
+        if r.ok:
+            # We know the new content; keep the old ETag so the next revalidation refetches
+            meta = _load_mirror_meta(gist_id)
+            if meta:
+                meta['files'] = sorted(set(meta.get('files', [])) | {filename})
+                meta.get('raw_urls', {}).pop(filename, None)
+                meta['fetched_at'] = time.time()
+                _save_mirror(gist_id, meta, {filename: content})
         return r.ok
     except Exception:
         return False
@@ -97,28 +255,27 @@ def _patch_gist_file(gist_id, filename, content):
 
 def _append_row_to_gist_csv(gist_id, filename, data, headers):
     """Append a CSV row (dict) to a file inside the gist. Creates file with headers if missing."""
+    return _append_rows_to_gist_csv(gist_id, filename, [data], headers)
+
+
+def _append_rows_to_gist_csv(gist_id, filename, rows, headers):
+    """Append several CSV rows (dicts) to a gist file with a single read and a single patch."""
     if not GITHUB_TOKEN or not gist_id:
         return False
-    # Read current content
-    existing = _read_gist_file_content(gist_id, filename)
+    # Read current content; always revalidate, since another process may have appended since
+    existing = _read_gist_file_content(gist_id, filename, max_age=0)
     if existing is None:
         # create with headers
         existing = ','.join(headers) + '\n'
-    # Build CSV row
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=headers)
-    # If existing has only headers and no newline, ensure writer doesn't write header again
-    # We will always append only the row
-    row = {k: ('' if data.get(k) is None else data.get(k)) for k in headers}
     # ensure proper CSV formatting for fields that contain newlines/commas
     out_row_io = io.StringIO()
     csv_writer = csv.DictWriter(out_row_io, fieldnames=headers)
-    csv_writer.writerow(row)
-    row_text = out_row_io.getvalue()
+    for data in rows:
+        csv_writer.writerow({k: ('' if data.get(k) is None else data.get(k)) for k in headers})
     # Append to existing content
     if not existing.endswith('\n'):
         existing = existing + '\n'
-    new_content = existing + row_text
+    new_content = existing + out_row_io.getvalue()
     return _patch_gist_file(gist_id, filename, new_content)
 
 
@@ -141,9 +298,19 @@ def push_gist_file(filename, content):
             return False
     return _patch_gist_file(gist_id, filename, content)
 
+def _connect():
+    """Open a connection that waits for other writers instead of failing straight away."""
+    return sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT)
+
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
+    # WAL lets readers carry on while a writer commits
+    try:
+        c.execute('PRAGMA journal_mode=WAL')
+    except sqlite3.OperationalError:
+        pass
     c.execute('''CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT UNIQUE,
@@ -187,6 +354,53 @@ def init_db():
         c.execute('ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT 0')
     except sqlite3.OperationalError:
         pass
+    c.execute('''CREATE TABLE IF NOT EXISTS generation_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        status TEXT DEFAULT 'queued',
+        params TEXT,
+        result TEXT,
+        error TEXT,
+        created_at REAL,
+        updated_at REAL,
+        error_detail TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )''')
+    try:
+        # Raw exception text, kept apart from the message shown to users
+        c.execute('ALTER TABLE generation_jobs ADD COLUMN error_detail TEXT')
+    except sqlite3.OperationalError:
+        pass
+    c.execute('CREATE INDEX IF NOT EXISTS idx_generation_jobs_user ON generation_jobs (user_id, id)')
+    c.execute('''CREATE TABLE IF NOT EXISTS pregenerated_itineraries (
+        cache_key TEXT PRIMARY KEY,
+        params TEXT,
+        content TEXT,
+        created_at REAL
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS itinerary_versions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        itinerary_id INTEGER,
+        version INTEGER,
+        content TEXT,
+        note TEXT,
+        created_at REAL,
+        FOREIGN KEY (itinerary_id) REFERENCES itineraries (id)
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_itinerary_versions_itinerary ON itinerary_versions (itinerary_id, version)')
+    c.execute('''CREATE TABLE IF NOT EXISTS generation_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        duration_days INTEGER,
+        budget_tokens INTEGER,
+        tokens_generated INTEGER,
+        stopped_early BOOLEAN DEFAULT 0,
+        truncated BOOLEAN DEFAULT 0,
+        elapsed REAL,
+        created_at REAL
+    )''')
+    # Keyset paging of chat history walks this index instead of scanning the table
+    c.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_itinerary ON chat_messages (itinerary_id, id)')
     conn.commit()
     conn.close()
 
@@ -194,19 +408,25 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def save_to_csv(filename, data, headers):
+    save_rows_to_csv(filename, [data], headers)
+
+def save_rows_to_csv(filename, rows, headers):
+    """Append rows to a local CSV mirror and push them to the gist in one background call."""
+    if not rows:
+        return
     file_exists = os.path.isfile(filename)
     with open(filename, 'a', newline='') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=headers)
         if not file_exists:
             writer.writeheader()
-        writer.writerow(data)
+        writer.writerows(rows)
     # If GITHUB_TOKEN is configured, also append/update the gist file in background
     try:
         def _bg_append():
             try:
                 gist_id = init_gist()
                 if gist_id:
-                    _append_row_to_gist_csv(gist_id, filename, data, headers)
+                    _append_rows_to_gist_csv(gist_id, filename, rows, headers)
             except Exception:
                 pass
 
@@ -216,25 +436,221 @@ def save_to_csv(filename, data, headers):
         # Fail silently and keep local CSV as the primary fallback
         pass
 
+
+# -------------------- Write path --------------------
+def _is_lock_error(exc):
+    msg = str(exc).lower()
+    return 'locked' in msg or 'busy' in msg
+
+
+def _run_transaction(work):
+    """Run work(cursor) inside BEGIN IMMEDIATE ... COMMIT, retrying while another process holds the lock."""
+    delay = 0.05
+    for attempt in range(DB_WRITE_RETRIES + 1):
+        conn = _connect()
+        conn.isolation_level = None  # we issue BEGIN/COMMIT ourselves
+        c = conn.cursor()
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            result = work(c)
+            c.execute('COMMIT')
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                c.execute('ROLLBACK')
+            if not _is_lock_error(e) or attempt == DB_WRITE_RETRIES:
+                raise
+        except Exception:
+            if conn.in_transaction:
+                c.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+class _WriterQueue:
+    """Single background thread that applies write transactions one at a time.
+
+    Every commit in the process goes through here, so threads serving different
+    Streamlit sessions never race each other for the SQLite write lock.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            work, future = self._queue.get()
+            try:
+                future.set_result(_run_transaction(work))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, work):
+        """Queue work(cursor) and block until it has been committed; returns its result."""
+        if threading.current_thread() is self._thread:
+            # A second connection would wait on the lock this transaction holds
+            raise RuntimeError('Nested database write: use the cursor passed to the transaction callback')
+        self._ensure_started()
+        future = Future()
+        self._queue.put((work, future))
+        return future.result()
+
+
+_writer = _WriterQueue()
+
+# Read-through cache for itinerary lists; writers bump ('user', id) or PUBLIC_SCOPE
+PUBLIC_SCOPE = 'public'
+_catalog_cache = VersionedCache()
+
+
+class _Ref:
+    """Stands in for the row id of an earlier write in the same UnitOfWork."""
+
+    def __init__(self, index):
+        self.index = index
+
+
+def _resolve(value, results):
+    return results[value.index] if isinstance(value, _Ref) else value
+
+
+class UnitOfWork:
+    """Collects related writes and commits them in a single transaction.
+
+    Usage:
+        with UnitOfWork() as uow:
+            uow.add_chat_message(itinerary_id, 'user', question)
+            uow.add_chat_message(itinerary_id, 'assistant', answer)
+
+    Each add_* call returns an index into ``uow.results`` which holds the new row
+    ids once the block exits; ``uow.ref(index)`` can be passed as a foreign key to
+    later calls. Extra statements that depend on earlier rows can be queued with
+    ``add(fn)`` where ``fn(cursor, results)`` runs inside the same transaction. CSV mirrors are written once per file after the commit succeeds.
+    """
+
+    def __init__(self):
+        self._ops = []
+        self._csv = []
+        self._invalidate = []
+        self.results = []
+
+    def add(self, fn, csv_file=None, csv_row=None, csv_headers=None):
+        """Queue fn(cursor, results) -> value. csv_row(value, results) builds an optional mirror row."""
+        self._ops.append(fn)
+        self._csv.append((csv_file, csv_row, csv_headers))
+        return len(self._ops) - 1
+
+    def ref(self, index):
+        return _Ref(index)
+
+    def invalidate(self, *scopes):
+        """Bump these catalog cache scopes once the transaction commits."""
+        self._invalidate.extend(scopes)
+
+    def add_user(self, username, password_hash, is_admin=0):
+        return self.add(
+            lambda c, results: c.execute('INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)',
+                                         (username, password_hash, is_admin)).lastrowid,
+            USERS_CSV,
+            lambda user_id, results: {'id': user_id, 'username': username, 'password_hash': password_hash, 'is_admin': is_admin},
+            USERS_HEADERS,
+        )
+
+    def add_itinerary(self, itinerary, user_id):
+        def _insert(c, results):
+            user_id_value = _resolve(user_id, results)
+            c.execute('''INSERT INTO itineraries (user_id, name, content, destination, duration, budget, preferences, user_name, is_public, num_people)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (user_id_value, itinerary.name, itinerary.content, itinerary.destination, itinerary.duration,
+                       itinerary.budget, itinerary.preferences, itinerary.user_name, itinerary.is_public, itinerary.num_people))
+            return c.lastrowid
+
+        def _row(itinerary_id, results):
+            return {
+                'id': itinerary_id,
+                'user_id': _resolve(user_id, results),
+                'name': itinerary.name,
+                'content': itinerary.content,
+                'destination': itinerary.destination,
+                'duration': itinerary.duration,
+                'budget': itinerary.budget,
+                'preferences': itinerary.preferences,
+                'user_name': itinerary.user_name,
+                'is_public': itinerary.is_public,
+                'num_people': itinerary.num_people
+            }
+
+        self.invalidate(('user', user_id))
+        if itinerary.is_public:
+            self.invalidate(PUBLIC_SCOPE)
+        return self.add(_insert, ITINERARIES_CSV, _row, ITINERARIES_HEADERS)
+
+    def add_chat_message(self, itinerary_id, role, content):
+        return self.add(
+            lambda c, results: c.execute('INSERT INTO chat_messages (itinerary_id, role, content) VALUES (?, ?, ?)',
+                                         (_resolve(itinerary_id, results), role, content)).lastrowid,
+            CHAT_CSV,
+            lambda chat_id, results: {'id': chat_id, 'itinerary_id': _resolve(itinerary_id, results), 'role': role, 'content': content},
+            CHAT_HEADERS,
+        )
+
+    def commit(self):
+        """Apply all queued writes atomically and mirror them to CSV. Returns the results list."""
+        ops = self._ops
+
+        def _work(c):
+            results = []
+            for fn in ops:
+                results.append(fn(c, results))
+            return results
+
+        self.results = _writer.submit(_work) if ops else []
+        self._ops = []
+        csv_batches = {}
+        for (csv_file, csv_row, csv_headers), value in zip(self._csv, self.results):
+            if csv_file and csv_row:
+                csv_batches.setdefault(csv_file, (csv_headers, []))[1].append(csv_row(value, self.results))
+        self._csv = []
+        for scope in self._invalidate:
+            if isinstance(scope, tuple):
+                scope = tuple(_resolve(part, self.results) for part in scope)
+            _catalog_cache.bump(scope)
+        self._invalidate = []
+        for csv_file, (csv_headers, rows) in csv_batches.items():
+            save_rows_to_csv(csv_file, rows, csv_headers)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
 def create_user(username, password):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    # Create a regular user by default (is_admin = 0). Admins are managed separately.
+    uow = UnitOfWork()
+    uow.add_user(username, hash_password(password), 0)
     try:
-        # Create a regular user by default (is_admin = 0). Admins are managed separately.
-        is_admin_flag = 0
-        c.execute('INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)',
-                  (username, hash_password(password), is_admin_flag))
-        conn.commit()
-        user_id = c.lastrowid
-        # Save to CSV (include is_admin)
-        save_to_csv(USERS_CSV, {'id': user_id, 'username': username, 'password_hash': hash_password(password), 'is_admin': is_admin_flag}, ['id', 'username', 'password_hash', 'is_admin'])
+        return uow.commit()[0]
     except sqlite3.IntegrityError:
-        user_id = None
-    conn.close()
-    return user_id
+        return None
 
 def authenticate_user(username, password):
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
     c.execute('SELECT id FROM users WHERE username = ? AND password_hash = ?',
               (username, hash_password(password)))
@@ -244,7 +660,7 @@ def authenticate_user(username, password):
 
 
 def get_user(user_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
     c.execute('SELECT id, username, is_admin FROM users WHERE id = ?', (user_id,))
     row = c.fetchone()
@@ -255,16 +671,12 @@ def get_user(user_id):
 
 
 def set_user_admin(user_id, is_admin=True):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('UPDATE users SET is_admin = ? WHERE id = ?', (1 if is_admin else 0, user_id))
-    conn.commit()
-    conn.close()
+    _writer.submit(lambda c: c.execute('UPDATE users SET is_admin = ? WHERE id = ?', (1 if is_admin else 0, user_id)))
     return True
 
 
 def list_users():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
     c.execute('SELECT id, username, is_admin FROM users ORDER BY id')
     rows = c.fetchall()
@@ -272,84 +684,372 @@ def list_users():
     return [{'id': r[0], 'username': r[1], 'is_admin': bool(r[2])} for r in rows]
 
 def save_itinerary(itinerary, user_id):
-    conn = sqlite3.connect(DB_PATH)
+    uow = UnitOfWork()
+    uow.add_itinerary(itinerary, user_id)
+    return uow.commit()[0]
+
+# Everything but content, which is fetched on first access (see Itinerary.content)
+ITINERARY_LIST_COLUMNS = 'id, name, destination, duration, budget, preferences, user_name, is_public, num_people'
+
+def _load_itinerary_content(itinerary_id):
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT content FROM itineraries WHERE id = ?', (itinerary_id,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def _load_itineraries(where, params, with_content=False):
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    columns = ITINERARY_LIST_COLUMNS + (', content' if with_content else '')
+    try:
+        rows = conn.execute(f'SELECT {columns} FROM itineraries WHERE ' + where, params).fetchall()
+    finally:
+        conn.close()
+    return [Itinerary.from_row(row, _load_itinerary_content) for row in rows]
+
+def get_itineraries(user_id):
+    return list(_catalog_cache.get_or_load(('user', user_id), lambda: _load_itineraries('user_id = ?', (user_id,))))
+
+def get_public_itineraries():
+    return list(_catalog_cache.get_or_load(PUBLIC_SCOPE, lambda: _load_itineraries('is_public = 1', ())))
+
+def get_public_itineraries_after(last_id, limit=500):
+    """Up to `limit` public itineraries with id greater than last_id, oldest first (bypasses the catalog cache)."""
+    return _load_itineraries('is_public = 1 AND id > ? ORDER BY id LIMIT ?', (last_id, limit), with_content=True)
+
+def invalidate_itinerary_cache(user_id=None, public=False):
+    """Drop cached itinerary lists after writes made outside UnitOfWork."""
+    if user_id is not None:
+        _catalog_cache.bump(('user', user_id))
+    if public:
+        _catalog_cache.bump(PUBLIC_SCOPE)
+
+def catalog_cache_stats():
+    return _catalog_cache.stats()
+
+def update_itinerary_content(itinerary_id, user_id, content, note=None):
+    """Replace an itinerary's content, keeping the previous text as a numbered version.
+
+    Only the owner may change it; raises ValueError if user_id does not own the
+    itinerary. Returns the version number given to the old content.
+    """
+    def _archive(c, results):
+        c.execute('SELECT content FROM itineraries WHERE id = ? AND user_id = ?', (itinerary_id, user_id))
+        row = c.fetchone()
+        if row is None:
+            raise ValueError(f'Itinerary {itinerary_id} not found for user {user_id}')
+        c.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM itinerary_versions WHERE itinerary_id = ?', (itinerary_id,))
+        version = c.fetchone()[0]
+        c.execute('INSERT INTO itinerary_versions (itinerary_id, version, content, note, created_at) VALUES (?, ?, ?, ?, ?)',
+                  (itinerary_id, version, row[0], note, time.time()))
+        return version
+
+    def _update(c, results):
+        c.execute('UPDATE itineraries SET content = ? WHERE id = ? AND user_id = ?', (content, itinerary_id, user_id))
+        if c.rowcount != 1:
+            raise ValueError(f'Itinerary {itinerary_id} not found for user {user_id}')
+        return c.rowcount
+
+    with UnitOfWork() as uow:
+        uow.add(_archive)
+        uow.add(_update)
+        uow.invalidate(('user', user_id), PUBLIC_SCOPE)
+    return uow.results[0]
+
+def get_itinerary_versions(itinerary_id):
+    conn = _connect()
     c = conn.cursor()
-    c.execute('''INSERT INTO itineraries (user_id, name, content, destination, duration, budget, preferences, user_name, is_public, num_people)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (user_id, itinerary.name, itinerary.content, itinerary.destination, itinerary.duration,
-               itinerary.budget, itinerary.preferences, itinerary.user_name, itinerary.is_public, itinerary.num_people))
-    itinerary_id = c.lastrowid
-    conn.commit()
+    c.execute('SELECT version, content, note, created_at FROM itinerary_versions WHERE itinerary_id = ? ORDER BY version DESC',
+              (itinerary_id,))
+    rows = c.fetchall()
     conn.close()
-    # Save to CSV
-    save_to_csv(ITINERARIES_CSV, {
-        'id': itinerary_id,
-        'user_id': user_id,
-        'name': itinerary.name,
-        'content': itinerary.content,
-        'destination': itinerary.destination,
-        'duration': itinerary.duration,
-        'budget': itinerary.budget,
-        'preferences': itinerary.preferences,
-        'user_name': itinerary.user_name,
-        'is_public': itinerary.is_public,
-        'num_people': itinerary.num_people
-    }, ['id', 'user_id', 'name', 'content', 'destination', 'duration', 'budget', 'preferences', 'user_name', 'is_public', 'num_people'])
-    return itinerary_id
+    return [{'version': r[0], 'content': r[1], 'note': r[2], 'created_at': r[3]} for r in rows]
 
-def get_itineraries(user_id):
-    conn = sqlite3.connect(DB_PATH)
+def save_chat_message(itinerary_id, role, content):
+    uow = UnitOfWork()
+    uow.add_chat_message(itinerary_id, role, content)
+    return uow.commit()[0]
+
+def save_chat_exchange(itinerary_id, question, answer):
+    """Store a user question and the assistant reply together in one transaction."""
+    with UnitOfWork() as uow:
+        uow.add_chat_message(itinerary_id, 'user', question)
+        uow.add_chat_message(itinerary_id, 'assistant', answer)
+    return uow.results
+
+def get_chat_history(itinerary_id):
+    conn = _connect()
     c = conn.cursor()
-    c.execute('SELECT * FROM itineraries WHERE user_id = ?', (user_id,))
+    c.execute('SELECT role, content FROM chat_messages WHERE itinerary_id = ? ORDER BY id', (itinerary_id,))
     rows = c.fetchall()
     conn.close()
-    return [Itinerary.from_dict({
-        'id': row[0],
-        'name': row[2],
-        'content': row[3],
-        'destination': row[4],
-        'duration': row[5],
-        'budget': row[6],
-        'preferences': row[7],
-        'user_name': row[8],
-        'is_public': row[9] if len(row) > 9 else False,
-        'num_people': row[10] if len(row) > 10 else None
-    }) for row in rows]
+    return [{'role': row[0], 'content': row[1]} for row in rows]
 
-def get_public_itineraries():
-    conn = sqlite3.connect(DB_PATH)
+def get_chat_page(itinerary_id, limit=CHAT_PAGE_SIZE, before_id=None):
+    """Return (messages, has_more): up to `limit` messages older than before_id (the newest
+    page when before_id is None), oldest first. has_more tells whether earlier messages exist."""
+    conn = _connect()
+    c = conn.cursor()
+    if before_id is None:
+        c.execute('SELECT id, role, content FROM chat_messages WHERE itinerary_id = ? ORDER BY id DESC LIMIT ?',
+                  (itinerary_id, limit + 1))
+    else:
+        c.execute('SELECT id, role, content FROM chat_messages WHERE itinerary_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                  (itinerary_id, before_id, limit + 1))
+    rows = c.fetchall()
+    conn.close()
+    has_more = len(rows) > limit
+    return [{'id': row[0], 'role': row[1], 'content': row[2]} for row in reversed(rows[:limit])], has_more
+
+def get_chat_messages_after(itinerary_id, after_id):
+    """Return every message newer than after_id, oldest first."""
+    conn = _connect()
     c = conn.cursor()
-    c.execute('SELECT * FROM itineraries WHERE is_public = 1')
+    c.execute('SELECT id, role, content FROM chat_messages WHERE itinerary_id = ? AND id > ? ORDER BY id',
+              (itinerary_id, after_id))
     rows = c.fetchall()
     conn.close()
-    return [Itinerary.from_dict({
+    return [{'id': row[0], 'role': row[1], 'content': row[2]} for row in rows]
+
+
+# -------------------- Generation jobs --------------------
+def _job_from_row(row):
+    return {
         'id': row[0],
-        'name': row[2],
-        'content': row[3],
-        'destination': row[4],
-        'duration': row[5],
-        'budget': row[6],
-        'preferences': row[7],
-        'user_name': row[8],
-        'is_public': row[9] if len(row) > 9 else False,
-        'num_people': row[10] if len(row) > 10 else None
-    }) for row in rows]
+        'user_id': row[1],
+        'status': row[2],
+        'params': json.loads(row[3]) if row[3] else {},
+        'result': row[4],
+        'error': row[5],
+        'created_at': row[6],
+        'updated_at': row[7],
+        'error_detail': row[8],
+    }
 
-def save_chat_message(itinerary_id, role, content):
-    conn = sqlite3.connect(DB_PATH)
+def create_generation_job(user_id, params):
+    now = time.time()
+    return _writer.submit(lambda c: c.execute(
+        'INSERT INTO generation_jobs (user_id, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+        (user_id, 'queued', json.dumps(params), now, now)).lastrowid)
+
+def claim_generation_job(job_id):
+    """Mark a queued job as running. Returns False if another worker already took it."""
+    return _writer.submit(lambda c: c.execute(
+        "UPDATE generation_jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+        (time.time(), job_id)).rowcount) == 1
+
+def finish_generation_job(job_id, result=None, error=None, error_detail=None):
+    """Store a job's result, or the message to show the user (error) plus the raw failure (error_detail)."""
+    status = 'failed' if error is not None else 'done'
+    _writer.submit(lambda c: c.execute(
+        'UPDATE generation_jobs SET status = ?, result = ?, error = ?, error_detail = ?, updated_at = ? WHERE id = ?',
+        (status, result, error, error_detail, time.time(), job_id)))
+
+def requeue_stale_generation_jobs(stale_after):
+    """Put jobs left 'running' by a dead process back in the queue; returns all queued jobs."""
+    cutoff = time.time() - stale_after
+    _writer.submit(lambda c: c.execute(
+        "UPDATE generation_jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?", (cutoff,)))
+    conn = _connect()
     c = conn.cursor()
-    c.execute('INSERT INTO chat_messages (itinerary_id, role, content) VALUES (?, ?, ?)',
-              (itinerary_id, role, content))
-    chat_id = c.lastrowid
-    conn.commit()
+    c.execute("SELECT * FROM generation_jobs WHERE status = 'queued' ORDER BY id")
+    rows = c.fetchall()
     conn.close()
-    # Save to CSV
-    save_to_csv(CHAT_CSV, {'id': chat_id, 'itinerary_id': itinerary_id, 'role': role, 'content': content}, ['id', 'itinerary_id', 'role', 'content'])
+    return [_job_from_row(row) for row in rows]
 
-def get_chat_history(itinerary_id):
-    conn = sqlite3.connect(DB_PATH)
+def get_generation_job(job_id):
+    conn = _connect()
     c = conn.cursor()
-    c.execute('SELECT role, content FROM chat_messages WHERE itinerary_id = ? ORDER BY id', (itinerary_id,))
+    c.execute('SELECT * FROM generation_jobs WHERE id = ?', (job_id,))
+    row = c.fetchone()
+    conn.close()
+    return _job_from_row(row) if row else None
+
+def list_generation_jobs(user_id, limit=10):
+    conn = _connect()
+    c = conn.cursor()
+    c.execute('SELECT * FROM generation_jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?', (user_id, limit))
+    rows = c.fetchall()
+    conn.close()
+    return [_job_from_row(row) for row in rows]
+
+
+# -------------------- Generation budgets --------------------
+def record_generation_stats(kind, duration_days, budget_tokens, tokens_generated, stopped_early, truncated, elapsed):
+    _writer.submit(lambda c: c.execute(
+        '''INSERT INTO generation_stats (kind, duration_days, budget_tokens, tokens_generated, stopped_early, truncated, elapsed, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+        (kind, duration_days, budget_tokens, tokens_generated, int(stopped_early), int(truncated), elapsed, time.time())))
+
+def generation_budget_report():
+    """Per prompt kind: how many tokens calls used against their budget."""
+    conn = _connect()
+    c = conn.cursor()
+    c.execute('''SELECT kind, COUNT(*), AVG(budget_tokens), AVG(tokens_generated),
+                        AVG(CAST(tokens_generated AS REAL) / budget_tokens),
+                        AVG(CASE WHEN duration_days > 0 THEN CAST(tokens_generated AS REAL) / duration_days END),
+                        AVG(stopped_early), AVG(truncated), AVG(elapsed)
+                 FROM generation_stats WHERE budget_tokens > 0 GROUP BY kind ORDER BY kind''')
+    rows = c.fetchall()
+    conn.close()
+    return [{
+        'kind': r[0],
+        'calls': r[1],
+        'avg_budget': round(r[2] or 0),
+        'avg_tokens': round(r[3] or 0),
+        'budget_used': round(r[4] or 0, 2),
+        'tokens_per_day': round(r[5], 1) if r[5] is not None else None,
+        'early_stop_rate': round(r[6] or 0, 2),
+        'truncation_rate': round(r[7] or 0, 2),
+        'avg_elapsed_s': round(r[8] or 0, 2),
+    } for r in rows]
+
+
+# -------------------- Pre-generated itineraries --------------------
+def pregenerated_key(params):
+    """Normalise generation inputs so equivalent requests share one cache entry."""
+    preferences = sorted(p.strip() for p in (params.get('preferences') or '').lower().split(',') if p.strip())
+    return json.dumps([
+        (params.get('destination') or '').strip().lower(),
+        int(params.get('duration_days') or 0),
+        re.sub(r'[^0-9a-z]', '', (params.get('budget') or '').lower()),
+        preferences,
+        int(params.get('num_people') or 1),
+    ])
+
+def save_pregenerated_itinerary(params, content):
+    key = pregenerated_key(params)
+    _writer.submit(lambda c: c.execute(
+        'INSERT OR REPLACE INTO pregenerated_itineraries (cache_key, params, content, created_at) VALUES (?, ?, ?, ?)',
+        (key, json.dumps(params), content, time.time())))
+    return key
+
+def get_pregenerated_itinerary(params):
+    """Return ready-made content for these inputs, or None."""
+    conn = _connect()
+    c = conn.cursor()
+    c.execute('SELECT content FROM pregenerated_itineraries WHERE cache_key = ?', (pregenerated_key(params),))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def list_pregenerated_keys():
+    conn = _connect()
+    c = conn.cursor()
+    c.execute('SELECT cache_key FROM pregenerated_itineraries')
     rows = c.fetchall()
     conn.close()
-    return [{'role': row[0], 'content': row[1]} for row in rows]
\ No newline at end of file
+    return {row[0] for row in rows}
+
+
+# -------------------- Snapshots --------------------
+def create_snapshot(compress=True, backup_dir=None, keep=None):
+    """Copy the live database into a timestamped snapshot file and return its path.
+
+    Uses SQLite's online backup API a few pages at a time while holding a read
+    transaction, so the copy is consistent and writers (WAL mode) carry on
+    committing while it runs.
+    """
+    backup_dir = backup_dir or BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    # One clock reading for the whole stamp, so names sort in creation order
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'-{int(now * 1000) % 1000:03d}'
+    name = f'{os.path.splitext(os.path.basename(DB_PATH))[0]}-{stamp}.db'
+    tmp_path = os.path.join(backup_dir, f'.{name}.tmp')
+    src = _connect()
+    dst = sqlite3.connect(tmp_path)
+    try:
+        # Pin one snapshot of the source for the whole copy
+        src.execute('BEGIN')
+        src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        src.rollback()
+        src.close()
+        dst.close()
+    if compress:
+        path = os.path.join(backup_dir, name + '.gz')
+        with open(tmp_path, 'rb') as f_in, gzip.open(path + '.part', 'wb', compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.replace(path + '.part', path)
+        os.remove(tmp_path)
+    else:
+        path = os.path.join(backup_dir, name)
+        os.replace(tmp_path, path)
+    rotate_snapshots(backup_dir, BACKUP_KEEP if keep is None else keep)
+    return path
+
+def list_snapshots(backup_dir=None):
+    """Return snapshot files, newest first, as dicts with path, size and mtime."""
+    backup_dir = backup_dir or BACKUP_DIR
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for name in os.listdir(backup_dir):
+        if not name.startswith('.') and (name.endswith('.db') or name.endswith('.db.gz')):
+            path = os.path.join(backup_dir, name)
+            info = os.stat(path)
+            snapshots.append({'path': path, 'name': name, 'size': info.st_size, 'mtime': info.st_mtime})
+    # Names carry a sortable timestamp
+    return sorted(snapshots, key=lambda snap: snap['name'], reverse=True)
+
+def rotate_snapshots(backup_dir=None, keep=BACKUP_KEEP):
+    """Delete all but the newest `keep` snapshots; returns the removed paths."""
+    removed = []
+    for snap in list_snapshots(backup_dir)[max(keep, 0):]:
+        try:
+            os.remove(snap['path'])
+            removed.append(snap['path'])
+        except OSError:
+            pass
+    return removed
+
+def restore_snapshot(path):
+    """Overwrite the live database with a snapshot (plain or .gz) in one backup pass."""
+    src_path = path
+    tmp_path = None
+    if path.endswith('.gz'):
+        tmp_path = os.path.join(os.path.dirname(path) or '.', f'.restore-{os.getpid()}.db')
+        with gzip.open(path, 'rb') as f_in, open(tmp_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        src_path = tmp_path
+    try:
+        src = sqlite3.connect(src_path)
+        dst = _connect()
+        try:
+            if src.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+                raise sqlite3.DatabaseError(f'Snapshot {path} failed its integrity check')
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _catalog_cache.clear()
+    return True
+
+_backup_thread = None
+
+def start_backup_scheduler(interval=None):
+    """Take a snapshot every `interval` seconds on a daemon thread (once per process)."""
+    global _backup_thread
+    interval = BACKUP_INTERVAL if interval is None else interval
+    if interval <= 0 or (_backup_thread and _backup_thread.is_alive()):
+        return _backup_thread
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                create_snapshot()
+            except Exception:
+                # Keep the schedule going; the next run gets another chance
+                pass
+
+    _backup_thread = threading.Thread(target=_loop, name='db-backup', daemon=True)
+    _backup_thread.start()
+    return _backup_thread
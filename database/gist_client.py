@@ -0,0 +1,95 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts for every gist call
+GIST_CONNECT_TIMEOUT = float(os.getenv('GIST_CONNECT_TIMEOUT', '3.05'))
+GIST_READ_TIMEOUT = float(os.getenv('GIST_READ_TIMEOUT', '10'))
+# Retries for idempotent requests on connection errors, 429 and 5xx
+GIST_RETRIES = int(os.getenv('GIST_RETRIES', '3'))
+# Keep-alive connections kept open to the API host
+GIST_POOL_SIZE = int(os.getenv('GIST_POOL_SIZE', '4'))
+
+
+class GistClient:
+    """Shared HTTP client for the GitHub gist API.
+
+    Holds one pooled keep-alive ``requests.Session`` with the auth headers set
+    once, applies the same timeout and retry policy to every call and records
+    per-method latency. Pass a different ``session`` (or set another client with
+    ``database.db.set_gist_client``) to point gist operations at a stub.
+    """
+
+    def __init__(self, base_url, token, session=None, timeout=None, retries=GIST_RETRIES,
+                 pool_size=GIST_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout or (GIST_CONNECT_TIMEOUT, GIST_READ_TIMEOUT)
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset(['GET']), respect_retry_after_header=True,
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        session.headers.update({'Accept': 'application/vnd.github.v3+json'})
+        if token:
+            session.headers['Authorization'] = f'token {token}'
+        self.session = session
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _url(self, path):
+        return path if path.startswith(('http://', 'https://')) else f'{self.base_url}{path}'
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        ok = False
+        try:
+            r = self.session.request(method, self._url(path), **kwargs)
+            ok = r.status_code < 500
+            return r
+        finally:
+            self._record(method, time.perf_counter() - start, ok)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def _record(self, method, elapsed, ok):
+        with self._lock:
+            entry = self._stats.setdefault(method, {'calls': 0, 'errors': 0, 'latencies': deque(maxlen=500)})
+            entry['calls'] += 1
+            if not ok:
+                entry['errors'] += 1
+            entry['latencies'].append(elapsed)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for method, entry in self._stats.items():
+                ordered = sorted(entry['latencies'])
+                n = len(ordered)
+                result[method] = {
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'avg_ms': 1000 * sum(ordered) / n if n else 0.0,
+                    'p95_ms': 1000 * ordered[max(0, math.ceil(0.95 * n) - 1)] if n else 0.0,
+                    'max_ms': 1000 * ordered[-1] if n else 0.0,
+                }
+            return result
+
+    def close(self):
+        self.session.close()
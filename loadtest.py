@@ -0,0 +1,237 @@
+"""Headless load driver for the app's main flows.
+
+Simulates concurrent sessions doing login -> generate -> save -> dashboard -> chat
+against a scratch database and the fake model backend, then prints throughput
+and p50/p95/p99 latency per step. Model calls take the same paths as in the app:
+generation runs as a queued job, and every call goes through admission control
+and its token budget, with chat prompts built by retrieval. The load test gets its
+own limiter (--rate/--burst, generous by default so the app rather than the token
+bucket is measured); pass the production LLM_RATE_PER_MIN/LLM_BURST values to see
+how the real quota behaves. Admission waits and rejections are reported at the end.
+
+    python loadtest.py --sessions 20 --iterations 5 --latency 0.2 --error-rate 0.02
+    python loadtest.py --sessions 20 --rate 30 --burst 5
+
+With --catalog N it instead seeds N itineraries and reports the memory taken by
+listing them, with content loaded lazily and eagerly:
+
+    python loadtest.py --catalog 5000
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db  # noqa: E402
+from models.itinerary import Itinerary  # noqa: E402
+from utils.admission import (  # noqa: E402
+    AdmissionController, LLM_MAX_QUEUE, LLM_MAX_WAIT, PRIORITY_CHAT, PRIORITY_FLIGHTS, PRIORITY_GENERATION
+)
+from utils.generation import run_generation  # noqa: E402
+from utils.jobs import JobRunner  # noqa: E402
+from utils.llm import FakeTravelModel, load_model  # noqa: E402
+from utils.prompts import itinerary_template, flight_template, chat_template  # noqa: E402
+from utils.retrieval import build_chat_context  # noqa: E402
+
+DESTINATIONS = ["Pune", "Goa", "Jaipur", "Kochi", "Shimla", "Udaipur"]
+STEPS = ["login", "generate", "save", "dashboard", "flights", "chat"]
+# How often a session checks on its generation job
+JOB_POLL_SECONDS = 0.05
+# Same admission wait the app gives background generation jobs
+JOB_ADMISSION_WAIT = float(os.getenv("JOB_ADMISSION_WAIT", "300"))
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+
+    def run(self, step, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception:
+            with self._lock:
+                self.errors[step] += 1
+            return None
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[step].append(elapsed)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def wait_for_job(job_id):
+    while True:
+        job = db.get_generation_job(job_id)
+        if job["status"] == "done":
+            return job["result"]
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+        time.sleep(JOB_POLL_SECONDS)
+
+
+def run_session(session_no, model, controller, runner, rec, iterations):
+    username = f"load_user_{session_no}"
+    password = "secret"
+
+    def _login():
+        user_id = db.authenticate_user(username, password)
+        if not user_id:
+            user_id = db.create_user(username, password) or db.authenticate_user(username, password)
+        return user_id
+
+    user_id = rec.run("login", _login)
+    if not user_id:
+        return
+    for i in range(iterations):
+        destination = DESTINATIONS[(session_no + i) % len(DESTINATIONS)]
+        days = 1 + (session_no + i) % 7
+        content = rec.run("generate", lambda: wait_for_job(runner.submit(user_id, {
+            "destination": destination,
+            "duration_days": days,
+            "budget": "INR50000",
+            "preferences": "food, culture",
+            "user_questions": "",
+            "user_name": username,
+            "num_people": 2,
+        })))
+        if content is None:
+            continue
+        itinerary = Itinerary(name=f"{destination} {i}", content=content, destination=destination,
+                              duration=days, budget="INR50000", preferences="food, culture",
+                              user_name=username, is_public=(i % 2 == 0), num_people=2)
+        itinerary_id = rec.run("save", db.save_itinerary, itinerary, user_id)
+        rec.run("dashboard", lambda: (db.get_itineraries(user_id), db.get_public_itineraries(),
+                                      db.get_chat_page(itinerary_id)))
+        rec.run("flights", lambda: run_generation(model, flight_template(), {
+            "origin": "Mumbai", "destination": destination}, "flights", PRIORITY_FLIGHTS, controller=controller))
+
+        def _chat():
+            question = f"What should I eat on Day {1 + i % days}?"
+            answer = run_generation(model, chat_template(), {
+                "itinerary": build_chat_context(itinerary_id, itinerary.content, question),
+                "question": question}, "chat", PRIORITY_CHAT, controller=controller)
+            db.save_chat_exchange(itinerary_id, question, answer)
+
+        rec.run("chat", _chat)
+
+
+def report(rec, wall, controller, rate, burst):
+    total = sum(len(v) for v in rec.timings.values())
+    print(f"{'step':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step in STEPS:
+        values = rec.timings[step]
+        print(f"{step:<10}{len(values):>7}{rec.errors[step]:>8}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}")
+    print(f"\n{total} operations in {wall:.2f}s ({total / wall if wall else 0:.1f} ops/s)")
+
+    stats = controller.stats()
+    rejected = ", ".join(f"{reason} {n}" for reason, n in sorted(stats["rejected"].items())) or "none"
+    print(f"\nlimiter: {rate:g} calls/min, burst {burst}, max queue {controller.max_queue}, "
+          f"max wait {controller.max_wait:g}s")
+    print(f"admission: {stats['admitted']} admitted, rejected: {rejected}")
+    for name, wait in stats["wait"].items():
+        if not wait["count"]:
+            continue
+        print(f"  {name:<10} waits {wait['count']:>5}  avg {wait['avg_wait_s'] * 1000:.0f} ms"
+              f"  p95 {wait['p95_wait_s'] * 1000:.0f} ms")
+
+
+def measure_catalog(count, model):
+    """Seed `count` itineraries and print the memory used to list them."""
+    content = (itinerary_template() | model).invoke({
+        "destination": "Goa", "duration_days": 5, "budget": "INR50000", "preferences": "food, culture",
+        "user_questions": "", "user_name": "catalog", "num_people": 2,
+    }).content
+    user_id = db.create_user("catalog_user", "secret") or db.authenticate_user("catalog_user", "secret")
+    existing = len(db._load_itineraries("user_id = ?", (user_id,)))
+    with db.UnitOfWork() as uow:
+        for i in range(existing, count):
+            uow.add_itinerary(Itinerary(name=f"Trip {i}", content=content, destination=DESTINATIONS[i % len(DESTINATIONS)],
+                                        duration=5, budget="INR50000", preferences="food, culture",
+                                        user_name="catalog_user", is_public=True, num_people=2), user_id)
+
+    print(f"{count} itineraries, {len(content)} chars of content each")
+    print(f"{'listing':<22}{'objects':>9}{'retained KiB':>14}{'peak KiB':>10}{'ms':>8}")
+    for label, with_content in (("lazy content", False), ("eager content", True)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        items = db._load_itineraries("user_id = ?", (user_id,), with_content=with_content)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<22}{len(items):>9}{current / 1024:>14.0f}{peak / 1024:>10.0f}{elapsed * 1000:>8.1f}")
+        del items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model base latency in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="fake model output rate, 0 for instant")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="fake", help="model backend (fake or huggingface)")
+    parser.add_argument("--workdir", default=None, help="directory for the scratch database and CSV mirrors")
+    parser.add_argument("--catalog", type=int, default=0, help="measure listing memory for this many itineraries")
+    parser.add_argument("--rate", type=float, default=6000, help="admission limit in model calls per minute")
+    parser.add_argument("--burst", type=int, default=50, help="calls allowed back to back after an idle period")
+    parser.add_argument("--max-wait", type=float, default=LLM_MAX_WAIT,
+                        help="seconds an interactive call waits for admission")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="travel-load-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    # Never push load-test rows to the real gist
+    db.GITHUB_TOKEN = None
+    db.init_db()
+
+    if args.backend == "fake":
+        model = FakeTravelModel(latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                                error_rate=args.error_rate, seed=args.seed)
+    else:
+        model = load_model(args.backend)
+
+    if args.catalog:
+        print(f"workdir: {workdir}")
+        measure_catalog(args.catalog, model)
+        return
+
+    if args.rate <= 0 or args.burst < 1:
+        parser.error("--rate must be positive and --burst at least 1")
+    controller = AdmissionController(rate_per_min=args.rate, burst=args.burst, max_queue=LLM_MAX_QUEUE,
+                                     max_wait=args.max_wait)
+    runner = JobRunner(lambda params: run_generation(
+        model, itinerary_template(), params, "itinerary", PRIORITY_GENERATION,
+        duration_days=params["duration_days"], max_wait=JOB_ADMISSION_WAIT, controller=controller))
+    rec = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        for n in range(args.sessions):
+            pool.submit(run_session, n, model, controller, runner, rec, args.iterations)
+    wall = time.perf_counter() - start
+    print(f"workdir: {workdir}")
+    report(rec, wall, controller, args.rate, args.burst)
+
+
+if __name__ == "__main__":
+    main()
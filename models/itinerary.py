@@ -1,8 +1,25 @@
+_UNLOADED = object()
+
+
 class Itinerary:
+    """A saved itinerary.
+
+    Uses ``__slots__`` so thousands of them can sit in the catalog cache without a
+    per-object ``__dict__``. ``content`` is the only large field; rows listed
+    without it get a loader instead and fetch the text on first access.
+    """
+
+    __slots__ = ('id', 'name', '_content', '_content_loader', 'destination', 'duration', 'budget',
+                 'preferences', 'user_name', 'is_public', 'num_people')
+
+    FIELDS = ('id', 'name', 'content', 'destination', 'duration', 'budget', 'preferences',
+              'user_name', 'is_public', 'num_people')
+
     def __init__(self, id=None, name=None, content=None, destination=None, duration=None, budget=None, preferences=None, user_name=None, is_public=False, num_people=None):
         self.id = id
         self.name = name
-        self.content = content
+        self._content = content
+        self._content_loader = None
         self.destination = destination
         self.duration = duration
         self.budget = budget
@@ -11,19 +28,31 @@ class Itinerary:
         self.is_public = is_public
         self.num_people = num_people
 
+    @property
+    def content(self):
+        if self._content is _UNLOADED:
+            self._content = self._content_loader(self.id)
+            self._content_loader = None
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._content_loader = None
+
+    @property
+    def content_loaded(self):
+        return self._content is not _UNLOADED
+
+    def __getstate__(self):
+        # Pickled copies carry the text rather than a loader bound to this process
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'content': self.content,
-            'destination': self.destination,
-            'duration': self.duration,
-            'budget': self.budget,
-            'preferences': self.preferences,
-            'user_name': self.user_name,
-            'is_public': self.is_public,
-            'num_people': self.num_people
-        }
+        return {field: getattr(self, field) for field in self.FIELDS}
 
     @classmethod
     def from_dict(cls, data):
@@ -38,4 +67,18 @@ class Itinerary:
             user_name=data.get('user_name'),
             is_public=data.get('is_public', False),
             num_people=data.get('num_people')
-        )
\ No newline at end of file
+        )
+
+    @classmethod
+    def from_row(cls, row, content_loader=None):
+        """Build from a mapping of column name to value (e.g. ``sqlite3.Row``).
+
+        Columns the row lacks keep their defaults. Without a ``content`` column,
+        ``content_loader(id)`` is called the first time the text is needed.
+        """
+        keys = row.keys()
+        itinerary = cls(**{field: row[field] for field in cls.FIELDS if field in keys})
+        if 'content' not in keys and content_loader is not None:
+            itinerary._content = _UNLOADED
+            itinerary._content_loader = content_loader
+        return itinerary
@@ -0,0 +1,115 @@
+"""Pre-generate itineraries for popular trips so the generate form can answer instantly.
+
+Reads a manifest of (destination, duration_days, budget, preferences, num_people)
+combinations from JSON (a list of objects) or CSV (with a header row), generates
+each one with the app's itinerary prompt and stores the result in the
+pregenerated_itineraries table. Combinations already stored are skipped, so an
+interrupted run can simply be started again.
+
+Admission control is per process, so this script does not queue behind the
+app's traffic. It gets its own rate limit instead, by default a quarter of
+LLM_RATE_PER_MIN (PREGENERATE_RATE_SHARE), so that the app and a running batch
+together stay near the endpoint quota. --rate sets calls per minute directly.
+
+    python pregenerate.py pregenerate_manifest.json --concurrency 2
+    python pregenerate.py pregenerate_manifest.json --rate 5
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.db import (  # noqa: E402
+    init_db, pregenerated_key, save_pregenerated_itinerary, list_pregenerated_keys
+)
+from utils.admission import AdmissionController, LLM_RATE_PER_MIN, PRIORITY_BATCH  # noqa: E402
+from utils.generation import run_generation  # noqa: E402
+from utils.llm import load_model  # noqa: E402
+from utils.prompts import itinerary_template, GENERIC_USER_NAME  # noqa: E402
+
+FIELDS = ['destination', 'duration_days', 'budget', 'preferences', 'num_people']
+# Fraction of the app's LLM_RATE_PER_MIN a batch run may use when --rate is not given
+PREGENERATE_RATE_SHARE = float(os.getenv('PREGENERATE_RATE_SHARE', '0.25'))
+
+
+def load_manifest(path):
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path) as f:
+            rows = json.load(f)
+    entries = []
+    for row in rows:
+        entries.append({
+            'destination': (row.get('destination') or '').strip(),
+            'duration_days': int(row.get('duration_days') or row.get('duration') or 1),
+            'budget': (row.get('budget') or '').strip(),
+            'preferences': (row.get('preferences') or '').strip(),
+            'num_people': int(row.get('num_people') or 1),
+        })
+    return [e for e in entries if e['destination']]
+
+
+def generate(model, controller, params):
+    inputs = dict(params, user_name=GENERIC_USER_NAME, user_questions='')
+    # Batch calls may wait a long time for a slot under the reduced rate
+    return run_generation(model, itinerary_template(), inputs, 'itinerary', PRIORITY_BATCH,
+                          duration_days=params['duration_days'], max_wait=3600, controller=controller)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('manifest', help='JSON or CSV file of trip combinations')
+    parser.add_argument('--concurrency', type=int, default=2, help='generations in flight at once')
+    parser.add_argument('--force', action='store_true', help='regenerate entries that already exist')
+    parser.add_argument('--backend', default=None, help='model backend (defaults to LLM_BACKEND)')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='model calls per minute for this run (defaults to PREGENERATE_RATE_SHARE of LLM_RATE_PER_MIN)')
+    args = parser.parse_args(argv)
+    if args.rate is not None and args.rate <= 0:
+        parser.error('--rate must be positive')
+
+    init_db()
+    entries = load_manifest(args.manifest)
+    done = set() if args.force else list_pregenerated_keys()
+    todo = []
+    for entry in entries:
+        key = pregenerated_key(entry)
+        if key not in done:
+            done.add(key)  # also drops duplicates within the manifest
+            todo.append(entry)
+    print(f"{len(entries)} entries in manifest, {len(todo)} to generate")
+    if not todo:
+        return 0
+
+    model = load_model(args.backend)
+    rate = args.rate if args.rate is not None else LLM_RATE_PER_MIN * PREGENERATE_RATE_SHARE
+    concurrency = max(1, args.concurrency)
+    # No burst: the batch should never take a run of calls away from the app
+    controller = AdmissionController(rate_per_min=rate, burst=1, max_queue=concurrency, max_wait=3600)
+    print(f"rate limit: {rate:g} calls/min")
+    failures = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(generate, model, controller, entry): entry for entry in todo}
+        for n, future in enumerate(as_completed(futures), start=1):
+            entry = futures[future]
+            label = f"{entry['destination']} / {entry['duration_days']}d / {entry['budget'] or '-'}"
+            try:
+                save_pregenerated_itinerary(entry, future.result())
+                print(f"[{n}/{len(todo)}] ok     {label}")
+            except Exception as e:
+                failures += 1
+                print(f"[{n}/{len(todo)}] failed {label}: {e}")
+    print(f"finished in {time.perf_counter() - start:.1f}s, {failures} failed (rerun to retry)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+from utils.generation import CostSectionWatcher, cost_section_complete
+
+
+def stream(text, days=None, size=7):
+    """Feed text in small chunks and return what run_generation would keep."""
+    watcher = CostSectionWatcher(days)
+    for i in range(0, len(text), size):
+        if watcher.feed(text[i:i + size]) is not None:
+            return text[:watcher.end]
+    return None
+
+
+PER_DAY_TOTALS = (
+    "**Day 1: Arrival**\nCheck in and walk to the market.\nTotal Estimated Cost: ₹4,500\n\n"
+    "**Day 2: Beaches**\nStart early and head to Baga beach.\nTotal Estimated Cost: ₹4,500\n\n"
+    "**Day 3: Forts**\nVisit Aguada fort.\nTotal Estimated Cost: ₹4,500\n\n"
+    "Tips:\n- Carry water\n\n"
+    "**Total Estimated Cost:**\n\n- Stay: 10,000\n- Food: 3,500\n\n"
+    "Enjoy your trip!\n"
+)
+
+
+def test_bold_cost_section_keeps_breakdown():
+    text = ("Day 1: Beach\n\n**Total Estimated Cost:**\n\n- Stay: 10,000\n- Food: 5,000\n\n"
+            "Total: INR 15,000 for two.\n\nEnjoy your trip!\n")
+    assert stream(text, days=1) == text[:text.index("Enjoy")]
+
+
+def test_heading_alone_is_not_complete():
+    assert not cost_section_complete("Day 1: Beach\n\n**Total Estimated Cost:**\n\n", days=1)
+
+
+def test_per_day_totals_do_not_stop_early():
+    kept = stream(PER_DAY_TOTALS, days=3)
+    assert kept == PER_DAY_TOTALS[:PER_DAY_TOTALS.index("Enjoy")]
+    # Without the day count the later headings still undo the per-day totals
+    assert stream(PER_DAY_TOTALS) == kept
+
+
+def test_cost_summary_before_days_does_not_stop_early():
+    text = ("Total Estimated Cost: ₹15,000 for the trip.\n\nHere is your plan.\n\n"
+            "Day 1: Market walk.\n\nDay 2: Beach day.\n\n"
+            "Total Estimated Cost: ₹15,000\n\nHappy travels!\n")
+    assert stream(text, days=2) == text[:text.index("Happy")]
+
+
+def test_incomplete_itinerary_never_stops():
+    text = "Day 1: Market walk.\nTotal Estimated Cost: ₹4,500\nStart early tomorrow.\n"
+    assert stream(text, days=3) is None
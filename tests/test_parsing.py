@@ -0,0 +1,61 @@
+import pytest
+
+from utils.parsing import extract_day, replace_day, split_itinerary
+from utils.retrieval import chunk_itinerary
+
+PLAIN = "Day 1: Arrive and walk the beach.\n\nDay 2: Beach day.\n\nTotal Estimated Cost: INR 20,000"
+BOLD = ("**Day 1:** Arrive.\n- Check in\n\n**Day 2:** Forts.\n\n**Tips:**\n- Carry water\n\n"
+        "**Total Estimated Cost:** INR 30,000")
+
+
+def test_replace_last_day_keeps_cost_section():
+    result = replace_day(PLAIN, 2, "Day 2: Museum and markets.")
+    assert result == "Day 1: Arrive and walk the beach.\n\nDay 2: Museum and markets.\n\nTotal Estimated Cost: INR 20,000"
+
+
+def test_replace_day_adds_missing_heading():
+    assert "Day 1: Late check-in." in replace_day(PLAIN, 1, "Late check-in.")
+
+
+def test_replace_unknown_day_raises():
+    with pytest.raises(ValueError):
+        replace_day(PLAIN, 3, "Day 3: Nothing")
+
+
+def test_split_plain_itinerary():
+    sections = split_itinerary(PLAIN)
+    assert [d.strip() for d in sections['days']] == ["Day 1: Arrive and walk the beach.", "Day 2: Beach day."]
+    assert sections['cost'] == "Total Estimated Cost: INR 20,000"
+
+
+def test_bold_headings_stay_with_their_section():
+    sections = split_itinerary(BOLD)
+    assert [d.strip() for d in sections['days']] == ["**Day 1:** Arrive.\n- Check in", "**Day 2:** Forts."]
+    assert sections['tips'].strip() == "**Tips:**\n- Carry water"
+    assert sections['cost'] == "**Total Estimated Cost:** INR 30,000"
+
+
+def test_bold_chunks_have_no_stray_markers():
+    chunks = chunk_itinerary(BOLD)
+    assert [label for label, _ in chunks] == ["Day 1", "Day 2", "Tips", "Total Estimated Cost"]
+    assert not any(text.endswith('*') for _, text in chunks)
+
+
+def test_replace_bold_last_day_keeps_tips_and_cost():
+    result = replace_day(BOLD, 2, "**Day 2:** Lake palace.")
+    assert "**Day 2:** Lake palace.\n\n**Tips:**" in result
+    assert result.endswith("**Total Estimated Cost:** INR 30,000")
+    assert "Forts" not in result
+
+
+def test_extract_day_drops_preamble_and_later_sections():
+    reply = ("Sure! Here is the new plan.\n\nDay 2: Museum and markets.\n- Lunch at the cafe\n\n"
+             "Day 3: Lake.\n\nTotal Estimated Cost: INR 9,000")
+    assert extract_day(reply, 2) == "Day 2: Museum and markets.\n- Lunch at the cafe"
+    assert extract_day("Sure! Day 3: Lake.", 2) is None
+
+
+def test_chatty_day_edit_replaces_one_day_only():
+    reply = "Sure! Here is the new plan.\n\nDay 2: Museum.\n\nDay 3: Lake.\n\nTotal Estimated Cost: INR 1"
+    result = replace_day(PLAIN, 2, extract_day(reply, 2))
+    assert result == "Day 1: Arrive and walk the beach.\n\nDay 2: Museum.\n\nTotal Estimated Cost: INR 20,000"
@@ -0,0 +1,150 @@
+import os
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+# Sustained model calls per minute allowed by our endpoint quota
+LLM_RATE_PER_MIN = float(os.getenv('LLM_RATE_PER_MIN', '30'))
+# Calls that may go out back to back after an idle period
+LLM_BURST = int(os.getenv('LLM_BURST', '5'))
+# Callers allowed to wait for a token before new ones are turned away
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '50'))
+# Seconds an interactive caller waits for a token before giving up
+LLM_MAX_WAIT = float(os.getenv('LLM_MAX_WAIT', '20'))
+
+# Lower value is served first
+PRIORITY_CHAT = 0
+PRIORITY_FLIGHTS = 1
+PRIORITY_DAY_EDIT = 2
+PRIORITY_GENERATION = 3
+PRIORITY_BATCH = 4
+
+PRIORITY_NAMES = {
+    PRIORITY_CHAT: 'chat',
+    PRIORITY_FLIGHTS: 'flights',
+    PRIORITY_DAY_EDIT: 'day_edit',
+    PRIORITY_GENERATION: 'generation',
+    PRIORITY_BATCH: 'batch',
+}
+
+
+# Shown instead of provider error text, which can carry status pages and URLs
+UNAVAILABLE_MESSAGE = "The AI service could not answer right now. Please try again in a moment."
+
+
+class Overloaded(Exception):
+    """Raised when a model call is shed instead of being sent to the endpoint."""
+
+    def __init__(self, reason):
+        super().__init__(f"The AI service is busy right now ({reason.replace('_', ' ')}), please try again shortly.")
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def take(self):
+        self.tokens -= 1
+
+
+class AdmissionController:
+    """Gatekeeper for every call to the shared model endpoint.
+
+    Callers queue by priority (chat ahead of bulk generation) and leave the
+    queue when the token bucket has a token for them. When the queue is full, or
+    a caller waits longer than ``max_wait``, the call is shed with
+    ``Overloaded`` so the UI can tell the user to retry instead of surfacing a
+    provider rate-limit error.
+    """
+
+    def __init__(self, rate_per_min=LLM_RATE_PER_MIN, burst=LLM_BURST, max_queue=LLM_MAX_QUEUE,
+                 max_wait=LLM_MAX_WAIT):
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITY_NAMES}
+
+    def acquire(self, priority=PRIORITY_GENERATION, max_wait=None):
+        """Block until the caller may call the endpoint; returns seconds spent waiting."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected['queue_full'] += 1
+                raise Overloaded('queue_full')
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiting[0] == entry:
+                        wait = self.bucket.wait_time(now)
+                        if wait == 0:
+                            self.bucket.take()
+                            heapq.heappop(self._waiting)
+                            self.admitted += 1
+                            self._waits.setdefault(priority, deque(maxlen=1000)).append(now - start)
+                            return now - start
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.rejected['timeout'] += 1
+                        raise Overloaded('timeout')
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                # The head may have changed; let the next caller re-check
+                self._cond.notify_all()
+
+    def invoke(self, chain, inputs, priority=PRIORITY_GENERATION, max_wait=None):
+        """Run chain.invoke(inputs) once admitted."""
+        self.acquire(priority, max_wait)
+        return chain.invoke(inputs)
+
+    def stats(self):
+        with self._cond:
+            waits = {}
+            for priority, values in self._waits.items():
+                ordered = sorted(values)
+                waits[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    'count': len(ordered),
+                    'avg_wait_s': sum(ordered) / len(ordered) if ordered else 0.0,
+                    'p95_wait_s': ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)] if ordered else 0.0,
+                }
+            return {
+                'queued': len(self._waiting),
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'tokens_available': round(self.bucket.tokens, 2),
+                'wait': waits,
+            }
+
+
+# Shared by every session and background worker in the process
+admission = AdmissionController()
@@ -0,0 +1,150 @@
+import os
+import re
+import time
+
+from database.db import record_generation_stats
+from utils.admission import admission
+
+# Output token budgets. Itineraries get a fixed part (greeting, tips, cost) plus a
+# per-day part; the scaling factors can be tuned from generation_budget_report().
+ITINERARY_BASE_TOKENS = int(os.getenv('ITINERARY_BASE_TOKENS', '300'))
+ITINERARY_TOKENS_PER_DAY = int(os.getenv('ITINERARY_TOKENS_PER_DAY', '220'))
+FLIGHT_TOKENS = int(os.getenv('FLIGHT_TOKENS', '350'))
+CHAT_TOKENS = int(os.getenv('CHAT_TOKENS', '450'))
+DAY_EDIT_TOKENS = int(os.getenv('DAY_EDIT_TOKENS', '400'))
+MAX_OUTPUT_TOKENS = int(os.getenv('MAX_OUTPUT_TOKENS', '8192'))
+
+_COST_HEADING = re.compile(r'Total Estimated Cost:', re.IGNORECASE)
+# Headings that open another section, so a cost line before them was not the closing one
+_SECTION_HEADING = re.compile(r'^[\s*_#>]*(?:Day (\d+):|Tips:)', re.IGNORECASE)
+_AMOUNT = re.compile(r'\d|[₹$€£¥]|\b(?:inr|rs|usd|eur|rupees?)\b', re.IGNORECASE)
+_LIST_ITEM = re.compile(r'^\s*(?:[-+•|]|\*(?!\*)|\d+[.)])\s')
+_MARKUP = re.compile(r'^[\s*_#>|=-]+|[\s*_|=-]+$')
+
+
+def token_budget(kind, duration_days=None):
+    """Return max output tokens for a prompt kind ('itinerary', 'flights', 'chat', 'day_edit')."""
+    if kind == 'itinerary':
+        budget = ITINERARY_BASE_TOKENS + ITINERARY_TOKENS_PER_DAY * max(1, int(duration_days or 1))
+    elif kind == 'flights':
+        budget = FLIGHT_TOKENS
+    elif kind == 'day_edit':
+        budget = DAY_EDIT_TOKENS
+    else:
+        budget = CHAT_TOKENS
+    return min(budget, MAX_OUTPUT_TOKENS)
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text with this tokenizer family
+    return max(1, round(len(text or '') / 4))
+
+
+def _cost_line_kind(line):
+    """Classify a line after the cost heading as 'content', 'blank' (also sub-headings) or 'other'."""
+    text = _MARKUP.sub('', line)
+    if not text:
+        return 'blank'
+    if _AMOUNT.search(text) or _LIST_ITEM.match(line):
+        return 'content'
+    if text.endswith(':'):
+        return 'blank'
+    return 'other'
+
+
+class CostSectionWatcher:
+    """Finds where an itinerary's closing "Total Estimated Cost:" section ends while text streams in.
+
+    Models also write cost totals per day or a summary before the days, so the
+    watcher only arms once the "Day {days}:" heading has been seen (any day
+    heading when ``days`` is unknown) and drops back to waiting whenever another
+    "Day N:" or "Tips:" heading follows a cost line. Once armed, the section is
+    finished at the first complete line that is not cost content (an amount, a
+    list item or a sub-heading) after some content, so markdown around the
+    heading, blank lines and several paragraphs of breakdown do not end it early.
+    Text is handled a line at a time; only the unfinished line is kept between chunks.
+    """
+
+    def __init__(self, days=None):
+        self.days = int(days) if days else None
+        self._buffer = ''
+        self._offset = 0  # position of _buffer[0] in the full text
+        self._armed = False
+        self._in_cost = False
+        self._seen_content = False
+        self.end = None
+
+    def _line(self, line):
+        """Handle one complete line; returns True if the cost section ended before it."""
+        heading = _SECTION_HEADING.match(line)
+        if heading:
+            self._in_cost = self._seen_content = False
+            if heading.group(1) and (self.days is None or int(heading.group(1)) >= self.days):
+                self._armed = True
+            return False
+        if not self._in_cost:
+            m = _COST_HEADING.search(line)
+            if not (m and self._armed):
+                return False
+            self._in_cost = True
+            line = line[m.end():]
+        kind = _cost_line_kind(line)
+        if kind == 'content':
+            self._seen_content = True
+        return kind == 'other' and self._seen_content
+
+    def feed(self, chunk):
+        """Add the next piece of text; returns the offset where the section ends, once known."""
+        if self.end is not None:
+            return self.end
+        self._buffer += chunk
+        while '\n' in self._buffer:
+            line, _, rest = self._buffer.partition('\n')
+            if self._line(line):
+                self.end = self._offset
+                return self.end
+            self._offset += len(line) + 1
+            self._buffer = rest
+        return None
+
+
+def cost_section_complete(text, days=None):
+    """True once the closing cost section has content and has been followed by a non-cost line."""
+    return CostSectionWatcher(days).feed(text) is not None
+
+
+def run_generation(model, prompt, inputs, kind, priority, duration_days=None, max_wait=None, controller=None):
+    """Generate text for prompt/inputs within the token budget for `kind` and return it.
+
+    The call goes through admission control, is capped at the kind's budget and,
+    for itineraries, is cut off as soon as the cost section is finished instead of
+    paying for trailing sign-off text (see CostSectionWatcher). Tokens used against
+    the budget are recorded. ``controller`` defaults to the process-wide ``admission``.
+    """
+    budget = token_budget(kind, duration_days)
+    chain = prompt | model.bind(max_tokens=budget)
+    (controller or admission).acquire(priority, max_wait)
+    start = time.perf_counter()
+    parts = []
+    watcher = CostSectionWatcher(duration_days) if kind == 'itinerary' else None
+    stream = chain.stream(inputs)
+    try:
+        for chunk in stream:
+            parts.append(chunk.content if hasattr(chunk, 'content') else str(chunk))
+            if watcher and watcher.feed(parts[-1]) is not None:
+                break
+    finally:
+        # Closing the generator drops the connection so the endpoint stops generating
+        stream.close()
+    stopped_early = bool(watcher and watcher.end is not None)
+    text = ''.join(parts)
+    # Drop the start of whatever followed the cost section
+    text = (text[:watcher.end] if stopped_early else text).strip()
+    tokens = estimate_tokens(text)
+    truncated = not stopped_early and tokens >= 0.95 * budget
+    try:
+        record_generation_stats(kind, int(duration_days or 0), budget, tokens, stopped_early, truncated,
+                                time.perf_counter() - start)
+    except Exception:
+        pass
+    return text
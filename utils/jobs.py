@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import deque
+
+from database.db import (
+    create_generation_job, claim_generation_job, finish_generation_job,
+    requeue_stale_generation_jobs
+)
+from utils.admission import Overloaded, UNAVAILABLE_MESSAGE
+
+# Worker threads per process; this is also the cap on concurrent generation calls
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Jobs a single user may have running at once
+JOB_PER_USER_LIMIT = int(os.getenv('JOB_PER_USER_LIMIT', '1'))
+# A job still 'running' after this many seconds is assumed orphaned by a dead process
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '900'))
+
+
+class JobRunner:
+    """Runs itinerary generation jobs on a bounded pool of worker threads.
+
+    Jobs are persisted in the generation_jobs table before they are queued and
+    their result is written back when they finish, so a rerun or a closed tab
+    never loses a generated itinerary. Users are served round-robin and each
+    user has at most ``per_user_limit`` jobs running at a time.
+    """
+
+    def __init__(self, run_fn, workers=JOB_WORKERS, per_user_limit=JOB_PER_USER_LIMIT):
+        self._run_fn = run_fn
+        self.per_user_limit = per_user_limit
+        self._cond = threading.Condition()
+        self._queues = {}       # user_id -> deque of (job_id, params)
+        self._order = deque()   # users with queued work, in round-robin order
+        self._running = {}      # user_id -> running job count
+        self._threads = []
+        for n in range(workers):
+            t = threading.Thread(target=self._worker, name=f'generation-worker-{n}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, user_id, params):
+        """Persist a new job and queue it. Returns the job id."""
+        job_id = create_generation_job(user_id, params)
+        self._enqueue(job_id, user_id, params)
+        return job_id
+
+    def recover(self, stale_after=JOB_STALE_SECONDS):
+        """Queue jobs left unfinished by an earlier process."""
+        for job in requeue_stale_generation_jobs(stale_after):
+            self._enqueue(job['id'], job['user_id'], job['params'])
+
+    def queued(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def _enqueue(self, job_id, user_id, params):
+        with self._cond:
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._order.append(user_id)
+            self._queues[user_id].append((job_id, params))
+            self._cond.notify()
+
+    def _next(self):
+        # Caller holds self._cond
+        for _ in range(len(self._order)):
+            user_id = self._order[0]
+            self._order.rotate(-1)
+            if self._running.get(user_id, 0) >= self.per_user_limit:
+                continue
+            queue = self._queues[user_id]
+            job_id, params = queue.popleft()
+            if not queue:
+                del self._queues[user_id]
+                self._order.pop()
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            return user_id, job_id, params
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                item = self._next()
+                while item is None:
+                    self._cond.wait()
+                    item = self._next()
+            user_id, job_id, params = item
+            try:
+                if claim_generation_job(job_id):
+                    try:
+                        finish_generation_job(job_id, result=self._run_fn(params))
+                    except Overloaded as e:
+                        finish_generation_job(job_id, error=str(e), error_detail=e.reason)
+                    except Exception as e:
+                        finish_generation_job(job_id, error=UNAVAILABLE_MESSAGE,
+                                              error_detail=f'{e.__class__.__name__}: {e}')
+            except Exception:
+                # Database trouble: leave the job for recover() to pick up later
+                pass
+            finally:
+                with self._cond:
+                    self._running[user_id] -= 1
+                    self._cond.notify_all()
@@ -0,0 +1,174 @@
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+HF_REPO_ID = "mistralai/Mistral-7B-Instruct-v0.3"
+
+# "huggingface" (default) talks to the hosted endpoint, "fake" uses FakeTravelModel
+LLM_BACKEND = os.getenv("LLM_BACKEND", "huggingface")
+
+
+class FakeLLMError(RuntimeError):
+    """Raised by FakeTravelModel when error injection triggers."""
+
+
+_ACTIVITIES = [
+    "Morning: Walk through the old town and stop for breakfast at a local cafe",
+    "Visit the city museum and its art gallery",
+    "Afternoon: Lunch at a popular restaurant serving regional cuisine",
+    "Explore the main market and bazaar for souvenirs",
+    "Evening: Sunset at the viewpoint followed by dinner",
+    "Take a short taxi ride to the fort and hike to the top",
+    "Relax at the hotel and enjoy the pool",
+    "Night: Street food tour around the central square",
+]
+_TIPS = [
+    "Carry a reusable water bottle.",
+    "Book popular attractions a day in advance.",
+    "Use app-based taxis for fair fares.",
+    "Keep small change for markets and street food.",
+    "Start early to avoid crowds and midday heat.",
+]
+_AIRLINES = ["IndiGo", "Air India", "Vistara", "SpiceJet", "Akasa Air"]
+
+
+class FakeTravelModel(BaseChatModel):
+    """Deterministic stand-in for the HuggingFace chat model.
+
+    Recognises the itinerary, flight and chat prompts and answers with text in
+    the same shape the real model produces. Latency is ``latency`` seconds plus
+    one token per ``1 / tokens_per_sec`` seconds, and ``error_rate`` of calls
+    raise ``FakeLLMError``. All randomness comes from ``seed``.
+    """
+
+    latency: float = 0.0
+    tokens_per_sec: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-travel"
+
+    def _rng(self, prompt: str) -> random.Random:
+        with self._lock:
+            call = self._calls
+            self._calls += 1
+        digest = hashlib.sha256(f"{self.seed}:{call}:{prompt}".encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _respond(self, messages, stop, kwargs):
+        prompt = "\n".join(str(m.content) for m in messages)
+        rng = self._rng(prompt)
+        text = fake_response(prompt, rng)
+        for seq in stop or []:
+            if seq in text:
+                text = text[:text.index(seq)]
+        max_tokens = kwargs.get("max_tokens")
+        if max_tokens and len(text) > 4 * max_tokens:
+            # Same rough 4 characters per token the app uses for accounting
+            text = text[:4 * max_tokens]
+        failed = bool(self.error_rate) and rng.random() < self.error_rate
+        return text, failed
+
+    def _delay(self, tokens):
+        return tokens / self.tokens_per_sec if self.tokens_per_sec else 0.0
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text, failed = self._respond(messages, stop, kwargs)
+        time.sleep(self.latency + self._delay(len(text.split())))
+        if failed:
+            raise FakeLLMError("Simulated endpoint error")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text, failed = self._respond(messages, stop, kwargs)
+        time.sleep(self.latency)
+        if failed:
+            raise FakeLLMError("Simulated endpoint error")
+        for line in text.splitlines(keepends=True):
+            time.sleep(self._delay(len(line.split())))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=line))
+
+
+def _field(pattern, prompt, default):
+    m = re.search(pattern, prompt)
+    return m.group(1).strip() if m else default
+
+
+def fake_response(prompt: str, rng: random.Random) -> str:
+    """Build a realistic answer for one of the app's prompts."""
+    if "day-wise itinerary" in prompt:
+        destination = _field(r"itinerary for (.+?)\.", prompt, "your destination")
+        days = int(_field(r"Duration: (\d+)", prompt, "3"))
+        user_name = _field(r"User: (.+?),", prompt, "Traveller")
+        budget = _field(r"Budget: (.*)", prompt, "")
+        lines = [f"Hello {user_name}! Here is your {days}-day itinerary for {destination}"
+                 + (f" with a budget of {budget}" if budget else "") + ":", ""]
+        total = 0
+        for day in range(1, days + 1):
+            lines.append(f"Day {day}: {rng.choice(['Arrival', 'Heritage', 'Food', 'Culture', 'Leisure', 'Nature'])} day in {destination}")
+            for activity in rng.sample(_ACTIVITIES, 4):
+                price = rng.randrange(200, 2000, 50)
+                total += price
+                lines.append(f"- {activity} (₹{price})")
+            lines.append("")
+        lines.append("Tips:")
+        lines.extend(f"- {tip}" for tip in rng.sample(_TIPS, 3))
+        lines.append("")
+        lines.append(f"Total Estimated Cost: ₹{total:,} for the whole trip.")
+        lines.append("")
+        lines.append(f"Enjoy your trip, {user_name}! Let me know if you would like to change anything.")
+        return "\n".join(lines)
+    if "flight options" in prompt:
+        origin = _field(r"from (.+?) to ", prompt, "your city")
+        destination = _field(r" to (.+?)\. For each", prompt, "your destination")
+        lines = []
+        for i, airline in enumerate(rng.sample(_AIRLINES, 3), start=1):
+            stops = rng.choice(["Non-stop", "1 stop"])
+            hours = rng.randint(1, 6)
+            lines.append(f"{i}. {airline}: {origin} to {destination}, ₹{rng.randrange(3000, 15000, 100):,}, "
+                         f"{hours}h {rng.randint(0, 59)}m, {stops}. Good option for a {rng.choice(['morning', 'evening'])} departure.")
+        return "\n".join(lines)
+    question = _field(r"Answer: (.*)$", prompt, "your question")
+    return (f"Regarding \"{question}\": " + " ".join(rng.sample(_TIPS, 2))
+            + " You can also check the day-wise plan above for timings and costs.")
+
+
+def load_model(backend: Optional[str] = None):
+    """Return the chat model for the configured backend."""
+    backend = (backend or LLM_BACKEND).lower()
+    if backend == "fake":
+        return FakeTravelModel(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.5")),
+            tokens_per_sec=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+        )
+    from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
+    llm = HuggingFaceEndpoint(repo_id=HF_REPO_ID, task="text-generation")
+    return ChatHuggingFace(llm=llm)
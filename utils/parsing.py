@@ -47,6 +47,63 @@ def _clean_markdown(text: str) -> str:
     text = re.sub(r"^\s*[-\*\+]\s*", "", text)
     return text.strip()
 
+# Section patterns for the "Day N:" / "Tips:" / "Total Estimated Cost:" layout the prompt asks for.
+# Headings may carry markdown ("**Day 1:**", "### Tips:"); the markers stay with their own section.
+_HEADING_MARKUP = r'(?:[*_#]+[ \t]*)?'
+DAY_PATTERN = rf'({_HEADING_MARKUP}Day \d+:.*?)(?={_HEADING_MARKUP}(?:Day \d+:|Tips:|Total Estimated Cost:)|$)'
+TIPS_PATTERN = rf'({_HEADING_MARKUP}Tips:.*?)(?={_HEADING_MARKUP}Total Estimated Cost:|$)'
+COST_PATTERN = rf'({_HEADING_MARKUP}Total Estimated Cost:.*?)$'
+# "Day N:" at the start of a section, after any heading markup
+DAY_HEADING = r'[*_#\s]*(Day (\d+):)'
+
+
+def split_itinerary(content: str) -> dict:
+    """Split generated itinerary text into greeting, day sections, tips and cost."""
+    content = content or ''
+    greeting = ''
+    greeting_match = re.search(r'^(Hello .*?!)', content, re.MULTILINE | re.IGNORECASE)
+    if greeting_match:
+        greeting = greeting_match.group(1)
+        content = content.replace(greeting_match.group(0), '').strip()
+    days = re.findall(DAY_PATTERN, content, re.DOTALL | re.IGNORECASE)
+    tips_match = re.search(TIPS_PATTERN, content, re.DOTALL | re.IGNORECASE)
+    cost_match = re.search(COST_PATTERN, content, re.DOTALL | re.IGNORECASE)
+    return {
+        'greeting': greeting,
+        'days': days,
+        'tips': tips_match.group(1) if tips_match else '',
+        'cost': cost_match.group(1) if cost_match else '',
+    }
+
+
+def extract_day(reply: str, day_number: int):
+    """Return the first "Day N:" section of a model reply, without any preamble or later sections.
+
+    Returns None when the reply has no section for that day.
+    """
+    for m in re.finditer(DAY_PATTERN, reply or '', re.DOTALL | re.IGNORECASE):
+        heading = re.match(DAY_HEADING, m.group(1), re.IGNORECASE)
+        if heading and int(heading.group(2)) == day_number:
+            return m.group(1).strip()
+    return None
+
+
+def replace_day(content: str, day_number: int, new_day: str) -> str:
+    """Return content with the "Day N:" section swapped for new_day."""
+    for m in re.finditer(DAY_PATTERN, content, re.DOTALL | re.IGNORECASE):
+        heading = re.match(DAY_HEADING, m.group(1), re.IGNORECASE)
+        if heading and int(heading.group(2)) == day_number:
+            new_day = new_day.strip()
+            if not re.match(rf'[*_#\s]*Day {day_number}:', new_day, re.IGNORECASE):
+                new_day = f"Day {day_number}: {new_day}"
+            old = m.group(1)
+            trailing = old[len(old.rstrip()):]
+            if not trailing and m.end(1) < len(content):
+                trailing = '\n\n'
+            return content[:m.start(1)] + new_day + trailing + content[m.end(1):]
+    raise ValueError(f"Day {day_number} not found in itinerary")
+
+
 def display_itinerary(content, theme='Dark'):
     # Define colors for dark theme
     bg_color = '#121212'
@@ -146,35 +203,21 @@ def display_itinerary(content, theme='Dark'):
     </style>
     """, unsafe_allow_html=True)
     
-    # Extract greeting
-    greeting_match = re.search(r'^(Hello .*?!)', content, re.MULTILINE | re.IGNORECASE)
-    if greeting_match:
-        st.markdown(f"### {greeting_match.group(1)}")
-        content = content.replace(greeting_match.group(0), '').strip()
-    
-    # Improved parsing: Find all Day sections, Tips, and Total Cost
-    day_pattern = r'(Day \d+:.*?)(?=Day \d+:|Tips:|$)'
-    tips_pattern = r'(Tips:.*?)(?=Total Estimated Cost:|$)'
-    cost_pattern = r'(Total Estimated Cost:.*?)$'
-    
-    days = re.findall(day_pattern, content, re.DOTALL | re.IGNORECASE)
-    tips_match = re.search(tips_pattern, content, re.DOTALL | re.IGNORECASE)
-    tips = tips_match.group(1) if tips_match else ""
-    cost_match = re.search(cost_pattern, content, re.DOTALL | re.IGNORECASE)
-    cost = cost_match.group(1) if cost_match else ""
-    
-    # Remove tips and cost from content for days
-    content_without_extras = re.sub(tips_pattern, '', content, flags=re.DOTALL | re.IGNORECASE).strip()
-    content_without_extras = re.sub(cost_pattern, '', content_without_extras, flags=re.DOTALL | re.IGNORECASE).strip()
+    sections = split_itinerary(content)
+    if sections['greeting']:
+        st.markdown(f"### {sections['greeting']}")
+    days = sections['days']
+    tips = sections['tips']
+    cost = sections['cost']
     
     # Display days
     for day in days:
         day = day.strip()
         if day:
-            day_title_match = re.match(r'(Day \d+:)', day, re.IGNORECASE)
+            day_title_match = re.match(DAY_HEADING, day, re.IGNORECASE)
             if day_title_match:
                 title = day_title_match.group(1)
-                activities = day.replace(title, '').strip()
+                activities = day[day_title_match.end():].lstrip('*_').strip()
                 raw_lines = [line for line in activities.split('\n') if line.strip()]
                 activity_lines = [_clean_markdown(line).strip() for line in raw_lines if _clean_markdown(line).strip()]
                 if activity_lines:
@@ -201,7 +244,7 @@ def display_itinerary(content, theme='Dark'):
     
     # Display tips
     if tips:
-        tips_content = tips.replace('Tips:', '').strip()
+        tips_content = re.sub(r'^[*_#\s]*Tips:[*_]*', '', tips, flags=re.IGNORECASE).strip()
         raw_tips = [line for line in tips_content.split('\n') if line.strip()]
         tip_lines = [_clean_markdown(line) for line in raw_tips if _clean_markdown(line)]
         if tip_lines:
@@ -216,7 +259,7 @@ def display_itinerary(content, theme='Dark'):
     
     # Display total cost
     if cost:
-        cost_content = cost.replace('Total Estimated Cost:', '').strip()
+        cost_content = re.sub(r'^[*_#\s]*Total Estimated Cost:[*_]*', '', cost, flags=re.IGNORECASE).strip()
         st.markdown(f"""
         <div class="tips-card">
             <h4 style="margin: 0; font-weight: bold;">💰 Total Estimated Cost</h4>
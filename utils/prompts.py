@@ -0,0 +1,75 @@
+import re
+
+from langchain_core.prompts import PromptTemplate
+
+# Name used when generating itineraries ahead of time for no particular user
+GENERIC_USER_NAME = "Traveller"
+
+
+def itinerary_template():
+    return PromptTemplate(
+        input_variables=[
+            "destination", "duration_days", "budget", "preferences",
+            "user_questions", "user_name", "num_people"
+        ],
+        template="""
+You are a friendly, professional travel planner AI.
+Generate a detailed, day-wise itinerary for {destination}.
+
+Duration: {duration_days} days
+Budget: {budget}
+Preferences: {preferences}
+User: {user_name}, traveling with {num_people} people.
+
+If user provided questions: {user_questions}
+
+Output clearly structured text with headings:
+Day 1:, Day 2:, etc., including activities, restaurants, timing, and short notes.
+After the last day, end with a "Tips:" section and then a "Total Estimated Cost:"
+section for the whole trip.
+Avoid photos or image placeholders.
+"""
+    )
+
+
+def flight_template():
+    return PromptTemplate(
+        input_variables=["origin", "destination"],
+        template="""You are a travel assistant. Provide top 3 flight options 
+                        from {origin} to {destination}. For each: airline, price (INR), duration, stops, and short note."""
+    )
+
+
+def chat_template():
+    return PromptTemplate(
+        input_variables=["itinerary", "question"],
+        template="You are a travel assistant. Given this itinerary: {itinerary}. Answer: {question}"
+    )
+
+
+def day_edit_template():
+    return PromptTemplate(
+        input_variables=["destination", "budget", "num_people", "outline", "day_text", "day_label", "instructions"],
+        template="""
+You are a friendly, professional travel planner AI.
+Rewrite one day of an existing itinerary for {destination} (budget {budget}, {num_people} people).
+
+Trip outline:
+{outline}
+
+Current plan for {day_label}:
+{day_text}
+
+Change requested: {instructions}
+
+Output only the new plan for {day_label}, starting with the heading "{day_label}:".
+Include activities, restaurants, timing, and short notes. Do not repeat other days.
+"""
+    )
+
+
+def personalize(content, user_name):
+    """Swap the generic traveller name in a pre-generated itinerary for the user's name."""
+    if not content or not user_name:
+        return content
+    return re.sub(rf'\b{GENERIC_USER_NAME}\b', lambda m: user_name, content)
@@ -0,0 +1,125 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from utils.parsing import DAY_HEADING, split_itinerary
+
+# Itineraries shorter than this are sent to the model whole
+RETRIEVAL_MIN_CHARS = int(os.getenv('RETRIEVAL_MIN_CHARS', '1500'))
+# Sections added to the chat prompt besides the outline
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '3'))
+# Indexed itineraries kept in memory
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', '256'))
+
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'at', 'be', 'can', 'do', 'for', 'from', 'how', 'i', 'in', 'is',
+    'it', 'me', 'my', 'of', 'on', 'or', 'should', 'the', 'to', 'we', 'what', 'when', 'where',
+    'which', 'with', 'you', 'your',
+}
+
+
+def tokenize(text):
+    return [t for t in re.findall(r'[a-z0-9]+', (text or '').lower()) if t not in _STOPWORDS]
+
+
+def chunk_itinerary(content):
+    """Return (label, text) chunks: one per day plus tips and cost when present."""
+    sections = split_itinerary(content)
+    chunks = []
+    for day in sections['days']:
+        day = day.strip()
+        m = re.match(DAY_HEADING, day, re.IGNORECASE)
+        if day and m:
+            chunks.append((f'Day {int(m.group(2))}', day))
+    if sections['tips'].strip():
+        chunks.append(('Tips', sections['tips'].strip()))
+    if sections['cost'].strip():
+        chunks.append(('Total Estimated Cost', sections['cost'].strip()))
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a handful of itinerary sections."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._tfs = [Counter(tokenize(text)) for _, text in chunks]
+        self._lens = [sum(tf.values()) for tf in self._tfs]
+        self._avg_len = (sum(self._lens) / len(self._lens)) if self._lens else 0.0
+        df = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+        self.outline = [text.splitlines()[0].strip() for _, text in chunks]
+
+    def scores(self, query):
+        terms = tokenize(query)
+        result = []
+        for tf, length in zip(self._tfs, self._lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_len) if self._avg_len else self.k1
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            result.append(score)
+        return result
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_index(itinerary_id, content):
+    """Return the cached BM25 index for an itinerary, rebuilding it if the content changed."""
+    key = (itinerary_id, hash(content))
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = BM25Index(chunk_itinerary(content))
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > RETRIEVAL_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def build_chat_context(itinerary_id, content, question, top_k=RETRIEVAL_TOP_K):
+    """Return the itinerary text to put in a chat prompt for this question.
+
+    Long itineraries are reduced to a one-line-per-section outline plus the
+    sections that best match the question (any "Day N" the question names is
+    always included). Short or unstructured itineraries, and questions that
+    match nothing, get the full content.
+    """
+    if not content or len(content) < RETRIEVAL_MIN_CHARS:
+        return content
+    index = get_index(itinerary_id, content)
+    if len(index.chunks) <= top_k:
+        return content
+
+    picked = []
+    labels = [label.lower() for label, _ in index.chunks]
+    for day_no in re.findall(r'\bday\s*(\d+)', question or '', re.IGNORECASE):
+        label = f'day {int(day_no)}'
+        if label in labels and labels.index(label) not in picked:
+            picked.append(labels.index(label))
+    scores = index.scores(question)
+    for i in sorted(range(len(scores)), key=lambda i: scores[i], reverse=True):
+        if len(picked) >= top_k or scores[i] <= 0:
+            break
+        if i not in picked:
+            picked.append(i)
+    if not picked:
+        return content
+
+    outline = '\n'.join(f'- {line}' for line in index.outline)
+    sections = '\n\n'.join(index.chunks[i][1] for i in sorted(picked))
+    return f"Trip outline:\n{outline}\n\nRelevant sections:\n{sections}"
@@ -0,0 +1,184 @@
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from database.db import get_public_itineraries_after
+from utils.retrieval import tokenize
+
+# Width of the hashed feature vectors (100k itineraries x 128 float32 = ~51 MB)
+SIMILAR_DIMS = int(os.getenv('SIMILAR_DIMS', '128'))
+# Seconds between background checks for public itineraries saved by other processes
+SIMILAR_SYNC_SECONDS = float(os.getenv('SIMILAR_SYNC_SECONDS', '10'))
+# Rows fetched per query while catching up
+SIMILAR_SYNC_BATCH = int(os.getenv('SIMILAR_SYNC_BATCH', '500'))
+# Most frequent content terms that go into an itinerary's vector
+SIMILAR_CONTENT_TERMS = int(os.getenv('SIMILAR_CONTENT_TERMS', '40'))
+
+_WEIGHTS = {'dest': 3.0, 'dur': 1.5, 'budget': 1.0, 'pref': 1.5, 'term': 0.6}
+
+
+def _budget_amount(budget):
+    m = re.search(r'(\d[\d,]*(?:\.\d+)?)\s*(k|l|lakh)?', (budget or '').lower())
+    if not m:
+        return None
+    amount = float(m.group(1).replace(',', ''))
+    if m.group(2) == 'k':
+        amount *= 1000
+    elif m.group(2) in ('l', 'lakh'):
+        amount *= 100000
+    return amount or None
+
+
+def _features(itinerary):
+    """Weighted sparse features: destination, duration/budget buckets, preferences and content terms."""
+    feats = Counter()
+    destination = (itinerary.destination or '').strip().lower()
+    if destination:
+        feats[f'dest:{destination}'] += _WEIGHTS['dest']
+    if itinerary.duration:
+        # log buckets so 4 and 5 days are close but 2 and 20 are not
+        bucket = int(round(math.log2(max(1, int(itinerary.duration))) * 2))
+        feats[f'dur:{bucket}'] += _WEIGHTS['dur']
+        feats[f'dur:{bucket - 1}'] += _WEIGHTS['dur'] / 2
+        feats[f'dur:{bucket + 1}'] += _WEIGHTS['dur'] / 2
+    amount = _budget_amount(itinerary.budget)
+    if amount:
+        bucket = int(round(math.log10(amount) * 3))
+        feats[f'budget:{bucket}'] += _WEIGHTS['budget']
+        feats[f'budget:{bucket - 1}'] += _WEIGHTS['budget'] / 2
+        feats[f'budget:{bucket + 1}'] += _WEIGHTS['budget'] / 2
+    for term in tokenize(itinerary.preferences):
+        feats[f'pref:{term}'] += _WEIGHTS['pref']
+    terms = Counter(t for t in tokenize(itinerary.content) if len(t) > 2 and not t.isdigit())
+    for term, tf in terms.most_common(SIMILAR_CONTENT_TERMS):
+        feats[f'term:{term}'] += _WEIGHTS['term'] * (1 + math.log(tf))
+    return feats
+
+
+def vectorize(itinerary, dims=SIMILAR_DIMS):
+    """Hash an itinerary's features into a unit-length float32 vector."""
+    vec = np.zeros(dims, dtype=np.float32)
+    for name, weight in _features(itinerary).items():
+        h = zlib.crc32(name.encode())
+        # Sign bit keeps hash collisions from only ever adding up
+        vec[h % dims] += weight if (h >> 31) & 1 else -weight
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SimilarityIndex:
+    """In-memory cosine index over public itineraries.
+
+    Rows live in one preallocated float32 matrix that doubles when full, so
+    adding an itinerary is O(1) and a query is a single matrix-vector product
+    plus ``argpartition`` over the filled rows. ``start()`` fills the index on a
+    background thread and keeps it in sync; queries never wait for that and see
+    whatever has been indexed so far (``ready`` says whether catch-up is done).
+    """
+
+    def __init__(self, dims=SIMILAR_DIMS, capacity=1024):
+        self.dims = dims
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((capacity, dims), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._meta = []
+        self._rows = {}
+        self._size = 0
+        self._last_id = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return int(self._active[:self._size].sum())
+
+    def _grow(self):
+        capacity = self._matrix.shape[0] * 2
+        for name in ('_matrix', '_ids', '_active'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def upsert(self, itinerary):
+        """Add or refresh an itinerary; non-public ones are removed from results."""
+        vec = vectorize(itinerary, self.dims)
+        meta = {'id': itinerary.id, 'name': itinerary.name, 'destination': itinerary.destination,
+                'duration': itinerary.duration, 'budget': itinerary.budget, 'user_name': itinerary.user_name}
+        with self._lock:
+            row = self._rows.get(itinerary.id)
+            if row is None:
+                if self._size == self._matrix.shape[0]:
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._rows[itinerary.id] = row
+                self._meta.append(meta)
+            else:
+                self._meta[row] = meta
+            self._matrix[row] = vec
+            self._ids[row] = itinerary.id
+            self._active[row] = bool(itinerary.is_public)
+
+    def sync(self):
+        """Pull public itineraries saved since the last sync (by any process)."""
+        # Only sync moves the cursor, so rows upserted locally are never skipped here
+        while True:
+            batch = get_public_itineraries_after(self._last_id, SIMILAR_SYNC_BATCH)
+            for itinerary in batch:
+                self.upsert(itinerary)
+                self._last_id = max(self._last_id, itinerary.id)
+            if len(batch) < SIMILAR_SYNC_BATCH:
+                break
+
+    def start(self, interval=SIMILAR_SYNC_SECONDS):
+        """Build the index and keep syncing it every `interval` seconds on a daemon thread (once)."""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return self._thread
+
+            def _loop():
+                while True:
+                    try:
+                        self.sync()
+                        self.ready = True
+                    except Exception:
+                        # Try again on the next round
+                        pass
+                    time.sleep(interval)
+
+            self._thread = threading.Thread(target=_loop, name='similar-index', daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def similar(self, itinerary, k=5):
+        """Return up to k dicts (itinerary metadata plus 'score') for the nearest public itineraries.
+
+        Starts the background build if needed and only searches what is indexed so far.
+        """
+        self.start()
+        vec = vectorize(itinerary, self.dims)
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            scores = self._matrix[:n] @ vec
+            scores[~self._active[:n]] = -np.inf
+            own = self._rows.get(itinerary.id)
+            if own is not None:
+                scores[own] = -np.inf
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [dict(self._meta[i], score=float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+# Shared by every session in the process
+similar_index = SimilarityIndex()